@@ -1,93 +1,1364 @@
 #!/usr/bin/env python3
-import os, json, time, asyncio, subprocess, re, random, sys
+import os, io, json, time, asyncio, subprocess, re, random, sys, threading, queue, atexit, sqlite3, hashlib, signal, socket
+import tempfile
+import multiprocessing, functools, contextvars, itertools, heapq
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from dataclasses import dataclass, field
 import requests
-from yt_dlp import YoutubeDL
-from playwright.async_api import async_playwright
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
-from google.auth.transport.requests import Request
-from PIL import Image, ImageDraw, ImageFont
-from openai import OpenAI
-from pytrends.request import TrendReq
+# Heavy dependencies (yt_dlp, playwright, googleapiclient / google-auth, PIL,
+# openai, pytrends + pandas) are imported inside the functions that use them,
+# so runs that exit early, and --check-only, never pay for them.
 
 # === CONFIG / ENV ===
 CLIENT_SECRETS = Path("client_secrets.json") 
 INSTAGRAM_PROFILE = os.getenv("INSTAGRAM_PROFILE", "").strip()
 IG_COOKIES_JSON = os.getenv("IG_COOKIES_JSON")
-PROCESSED_FILE = Path("processed_reels.json")
+INSTAGRAM_BASE_URL = os.getenv("INSTAGRAM_BASE_URL", "https://www.instagram.com").rstrip("/")
+PROCESSED_FILE = Path("processed_reels.json")  # legacy list, migrated into STATE_DB
+STATE_DB = Path(os.getenv("STATE_DB", "processed_reels.db"))
+# CI keeps only STATE_DB between runs, so a killed run must not leave rows behind in a -wal file
+STATE_JOURNAL_MODE = os.getenv("STATE_JOURNAL_MODE") or ("DELETE" if os.getenv("CI") else "WAL")
 DOWNLOAD_DIR = Path("downloads")
 THUMBNAIL_DIR = Path("thumbnails")
 TOKEN_FILE = Path("token.json")
 UPLOAD_LIMIT = int(os.getenv("UPLOAD_LIMIT", "1"))
+# Multi-profile mode: "profile_a:2,profile_b,profile_c:1" (limit defaults to UPLOAD_LIMIT)
+INSTAGRAM_PROFILES = os.getenv("INSTAGRAM_PROFILES", "").strip()
+PROFILE_CONCURRENCY = int(os.getenv("PROFILE_CONCURRENCY", "2"))
+# List new reels and exit: no downloads, uploads or AI calls (also via --check-only)
+CHECK_ONLY = os.getenv("CHECK_ONLY", "").lower() in ("1", "true", "yes") or "--check-only" in sys.argv[1:]
+# Daemon mode (also via --daemon): stay up and poll each profile on its own adaptive interval
+DAEMON_MODE = os.getenv("DAEMON", "").lower() in ("1", "true", "yes") or "--daemon" in sys.argv[1:]
+DAEMON_MIN_INTERVAL = int(os.getenv("DAEMON_MIN_INTERVAL", "600"))
+DAEMON_MAX_INTERVAL = int(os.getenv("DAEMON_MAX_INTERVAL", str(6 * 3600)))
+DAEMON_POLLS_PER_POST = float(os.getenv("DAEMON_POLLS_PER_POST", "4"))  # polls within a profile's usual posting gap
+DAEMON_BACKOFF = float(os.getenv("DAEMON_BACKOFF", "1.5"))  # interval growth after a poll finds nothing
+DAEMON_EWMA_ALPHA = 0.3
+DAEMON_HEARTBEAT_HOURS = float(os.getenv("DAEMON_HEARTBEAT_HOURS", "24"))  # 0 = no heartbeat message
+RUN_LEASE_SECONDS = int(os.getenv("RUN_LEASE_SECONDS", str(2 * 3600)))  # one run/cycle at a time per state DB
+# YouTube Data API quota (units per call; the default project quota is 10,000 per Pacific day)
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+YOUTUBE_PROJECT = os.getenv("YOUTUBE_PROJECT", "").strip()
+YOUTUBE_API_ROOT = os.getenv("YOUTUBE_API_ROOT", "").strip()  # e.g. a local stand-in; must end with "/"
+YOUTUBE_QUOTA_COSTS = {
+    "videos.insert": 1600,
+    "commentThreads.insert": 50,
+    "comments.setModerationStatus": 50,
+    "thumbnails.set": 50,
+}
+PACIFIC_TZ = ZoneInfo("America/Los_Angeles")
+YT_TOKEN_REFRESH_MARGIN = int(os.getenv("YT_TOKEN_REFRESH_MARGIN", "300"))  # refresh this many seconds before expiry
 YOUTUBE_SCOPES = [
     "https://www.googleapis.com/auth/youtube.upload",
     "https://www.googleapis.com/auth/youtube.force-ssl"
 ]
 MAX_SHORT_SECONDS = 60
+MAX_SOURCE_SECONDS = int(os.getenv("MAX_SOURCE_SECONDS", "180"))  # longer reels are skipped, shorter ones trimmed
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "4"))
+PROBE_CANDIDATE_FACTOR = int(os.getenv("PROBE_CANDIDATE_FACTOR", "2"))  # candidates probed per upload slot
 USER_AGENT_IPHONE = "Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Mobile/15E148 Safari/604.1"
 FFMPEG = "ffmpeg"
 FFPROBE = "ffprobe"
 
+# Shorts normalization (ffmpeg in a process pool, content-addressed output cache)
+NORMALIZE_CACHE_DIR = Path(os.getenv("NORMALIZE_CACHE_DIR", "normalized"))
+NORMALIZE_WORKERS = int(os.getenv("NORMALIZE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+NORMALIZE_VERSION = "1"  # bump when the ffmpeg recipes change to invalidate cached outputs
+SHORTS_ASPECT = 9 / 16
+SHORTS_ASPECT_TOLERANCE = 0.01
+
+# Duplicate detection: perceptual hashes of sampled frames, matched by Hamming distance
+FINGERPRINT_FRAMES = int(os.getenv("FINGERPRINT_FRAMES", "16"))
+FINGERPRINT_MIN_FRAMES = 4  # fewer informative frames than this: no verdict
+FINGERPRINT_MAX_DISTANCE = int(os.getenv("FINGERPRINT_MAX_DISTANCE", "10"))  # differing bits (of 64) per frame
+FINGERPRINT_MATCH_RATIO = float(os.getenv("FINGERPRINT_MATCH_RATIO", "0.6"))  # share of frames that must match
+FINGERPRINT_URL_TIMEOUT = float(os.getenv("FINGERPRINT_URL_TIMEOUT", "30"))  # open/read timeout hashing a streamed reel
+
+# Thumbnails: a keyframe of the reel with the title drawn on it, rendered in the media process pool
+THUMBNAIL_SIZE = (1280, 720)
+THUMBNAIL_FONT = os.getenv("THUMBNAIL_FONT", "DejaVuSans-Bold.ttf")
+THUMBNAIL_CANDIDATES = int(os.getenv("THUMBNAIL_CANDIDATES", "3"))  # keyframes compared per reel
+THUMBNAIL_UPLOAD = os.getenv("THUMBNAIL_UPLOAD", "1").lower() in ("1", "true", "yes")  # thumbnails().set after upload
+
+# Media cache: downloads/ and normalized/ share one disk budget, evicted least recently used first
+MEDIA_CACHE_MAX_BYTES = int(float(os.getenv("MEDIA_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+MEDIA_CACHE_PART_MAX_AGE = int(os.getenv("MEDIA_CACHE_PART_MAX_AGE", str(24 * 3600)))  # stale partial downloads
+
+# Pipeline: per-stage worker counts and the size of the queues between stages
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "2"))
+METADATA_CONCURRENCY = int(os.getenv("METADATA_CONCURRENCY", "2"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "1"))
+COMMENT_CONCURRENCY = int(os.getenv("COMMENT_CONCURRENCY", "1"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+
+# Reel discovery: scroll only until enough new reels (or already-processed ones) show up
+DISCOVERY_MAX_SCROLLS = int(os.getenv("DISCOVERY_MAX_SCROLLS", "10"))
+DISCOVERY_KNOWN_STREAK = int(os.getenv("DISCOVERY_KNOWN_STREAK", "3"))
+DISCOVERY_SCROLL_WAIT = float(os.getenv("DISCOVERY_SCROLL_WAIT", "4"))
+DISCOVERY_FIRST_DATA_TIMEOUT = float(os.getenv("DISCOVERY_FIRST_DATA_TIMEOUT", "10"))
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+# Discovery browser: "launch" (fresh Chromium + IG_COOKIES_JSON every run), "persistent" (the
+# ig_user_data profile from save_instagram_session.py) or "cdp" (attach to a long-lived Chromium)
+BROWSER_MODE = os.getenv("BROWSER_MODE", "launch").strip().lower()
+IG_USER_DATA_DIR = Path(os.getenv("IG_USER_DATA_DIR", "ig_user_data"))
+BROWSER_CDP_URL = os.getenv("BROWSER_CDP_URL", "http://127.0.0.1:9222").rstrip("/")
+BROWSER_PID_FILE = Path(os.getenv("BROWSER_PID_FILE", "browser.pid"))
+BROWSER_START_TIMEOUT = float(os.getenv("BROWSER_START_TIMEOUT", "20"))
+
+# Resumable uploads: chunk size must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = max(1, int(os.getenv("UPLOAD_CHUNK_MB", "8"))) * 1024 * 1024
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "5"))
+UPLOAD_RETRY_BASE_DELAY = float(os.getenv("UPLOAD_RETRY_BASE_DELAY", "2"))
+UPLOAD_SESSION_MAX_AGE = 6 * 24 * 3600  # YouTube keeps resumable sessions for about a week
+# Streaming (also via --stream): Shorts-ready reels go from yt-dlp's output straight into the resumable
+# upload through a one-chunk memory buffer; they touch disk only if the stream fails and they fall back.
+# The duplicate check still runs: its frames are read from the media URL with range requests (a few
+# extra MB per reel), and a reel whose URL cannot be hashed is downloaded and uploaded from disk instead
+STREAM_UPLOADS = os.getenv("STREAM_UPLOADS", "").lower() in ("1", "true", "yes") or "--stream" in sys.argv[1:]
+RESOURCE_SAMPLE_SECONDS = float(os.getenv("RESOURCE_SAMPLE_SECONDS", "0.5"))  # peak memory/disk sampling
+
+# AI titles: models tried in order, each with its own timeout
+TITLE_MODELS = [m.strip() for m in os.getenv("TITLE_MODELS", "gpt-4,gpt-3.5-turbo").split(",") if m.strip()]
+TITLE_TIMEOUT = float(os.getenv("TITLE_TIMEOUT", "15"))
+TITLE_CONCURRENCY = int(os.getenv("TITLE_CONCURRENCY", "4"))
+TITLE_CACHE_FILE = Path(os.getenv("TITLE_CACHE_FILE", "title_cache.json"))
+
+# Run reports: JSON per run plus a Prometheus textfile (node_exporter textfile collector)
+RUN_REPORT_DIR = Path(os.getenv("RUN_REPORT_DIR", "run_reports"))
+RUN_REPORT_KEEP = int(os.getenv("RUN_REPORT_KEEP", "50"))
+RUN_REPORT_HISTORY = int(os.getenv("RUN_REPORT_HISTORY", "20"))  # runs in the Telegram p50/p95 summary
+METRICS_FILE = Path(os.getenv("METRICS_FILE", "metrics/ig2yt.prom"))
+
+# Google Trends: one fetch per TTL, shared by titles and hashtags
+TRENDS_CACHE_FILE = Path(os.getenv("TRENDS_CACHE_FILE", "trends_cache.json"))
+TRENDS_TTL_SECONDS = int(os.getenv("TRENDS_TTL_SECONDS", "3600"))
+TRENDS_RETRY_SECONDS = int(os.getenv("TRENDS_RETRY_SECONDS", "300"))  # breaker cooldown after Trends fails
+TRENDS_TIMEOUT = float(os.getenv("TRENDS_TIMEOUT", "15"))
+YOUTUBE_TIMEOUT = float(os.getenv("YOUTUBE_TIMEOUT", "60"))  # per HTTP request (one upload chunk, one API call)
+
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-client = OpenAI()
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "10"))
+TELEGRAM_COALESCE_SECONDS = float(os.getenv("TELEGRAM_COALESCE_SECONDS", "1.5"))
+TELEGRAM_MIN_INTERVAL = float(os.getenv("TELEGRAM_MIN_INTERVAL", "1.0"))  # ~1 msg/sec per chat
+TELEGRAM_MAX_TEXT = 4096
+TELEGRAM_FLUSH_TIMEOUT = float(os.getenv("TELEGRAM_FLUSH_TIMEOUT", "120"))  # longest wait for queued messages
 
 _STOPWORDS = {"the", "and", "for", "with", "this", "that", "from", "your", "you", "are", "about", "have", "has", "not", "but", "just", "what", "when", "where", "who", "why", "how", "its", "it's", "can", "will", "get", "like", "new"}
 HACKING_TAGS = ["#ethicalhacking", "#cybersecurity", "#bugbounty", "#infosec", "#penetrationtesting", "#redteam", "#vulnerability", "#securityresearch", "#threatintel", "#whitehat", "#hackerlife", "#securitytips", "#hackingtools"]
 TRENDING_TAGS = ["#viral", "#trending", "#Shorts", "#foryou", "#explore", "#tech", "#contentcreator", "#daily", "#automation", "#viralshorts"]
 
-def send_telegram(msg):
-    if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
+# ---------------------- Resilience ----------------------
+class CircuitOpenError(RuntimeError):
+    """A call was refused because the service's circuit breaker is open."""
+
+@dataclass
+class ServicePolicy:
+    timeout: float  # seconds per attempt
+    retries: int  # retries per call
+    base_delay: float  # first backoff, doubled per retry, jittered
+    max_delay: float
+    failure_threshold: int  # consecutive failures that open the breaker
+    cooldown: float  # seconds open before one trial call is let through
+    retry_ratio: float = 0.2  # run-wide budget: retries <= retry_reserve + retry_ratio * attempts
+    retry_reserve: int = 5
+
+class ServiceGuard:
+    """
+    Timeout, retry budget and circuit breaker for one external service, shared by
+    every thread and coroutine in the process.
+
+    The breaker opens after `failure_threshold` consecutive failures; while open,
+    calls fail fast with CircuitOpenError so callers fall back at once. After
+    `cooldown` one trial call goes through (half-open) and its outcome closes or
+    re-opens it. The retry budget caps retries across the whole run, so a
+    struggling service is not hit with a multiple of the normal traffic.
+    """
+
+    def __init__(self, name, policy):
+        self.name = name
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started = None
+        self.attempts = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self._opened_at >= self.policy.cooldown else "open"
+
+    def allow(self):
+        """True if an attempt may go out now. In half-open state only one trial is in flight at a time."""
+        with self._lock:
+            state = self._state()
+            trial_free = self._trial_started is None or time.monotonic() - self._trial_started > self.policy.cooldown
+            if state == "closed" or (state == "half-open" and trial_free):
+                if state == "half-open":
+                    self._trial_started = time.monotonic()
+                self.attempts += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def record_success(self):
+        with self._lock:
+            was_open = self._opened_at is not None
+            self._failures, self._opened_at, self._trial_started = 0, None, None
+        if was_open:
+            self._announce(f"✅ {self.name} is reachable again; circuit closed")
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            self._trial_started = None
+            opening = self._opened_at is None and self._failures >= self.policy.failure_threshold
+            if opening or self._opened_at is not None:
+                self._opened_at = time.monotonic()  # a failed half-open trial restarts the cooldown
+        if opening:
+            self._announce(f"🔌 {self.name} circuit open after {self._failures} failures ({error}); "
+                           f"falling back for {self.policy.cooldown:.0f}s")
+
+    def retry_delay(self, attempt):
+        """Jittered backoff before retry `attempt` (1-based), or None when this call or the run is out of retries."""
+        with self._lock:
+            budget = self.policy.retry_reserve + self.policy.retry_ratio * self.attempts
+            if attempt > self.policy.retries or self.retries >= budget or self._state() != "closed":
+                return None
+            self.retries += 1
+        return min(self.policy.base_delay * (2 ** (attempt - 1)), self.policy.max_delay) * random.uniform(0.5, 1.0)
+
+    def call(self, fn, *args, retryable=lambda e: True, **kwargs):
+        """fn(*args, **kwargs) with breaker and retries. The timeout is up to fn (pass policy.timeout)."""
+        attempt = 0
+        while True:
+            self.check()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not retryable(e):
+                    self.record_success()  # the service answered; the request was the problem
+                    raise
+                self.record_failure(e)
+                attempt += 1
+                delay = self.retry_delay(attempt)
+                if delay is None:
+                    raise
+                span_note(retries=1)
+                time.sleep(delay)
+                continue
+            self.record_success()
+            return result
+
+    async def acall(self, make_coro, retryable=lambda e: True):
+        """Async call(): `make_coro()` is awaited with the policy timeout on each attempt."""
+        attempt = 0
+        while True:
+            self.check()
+            try:
+                result = await asyncio.wait_for(make_coro(), self.policy.timeout)
+            except Exception as e:
+                if not retryable(e):
+                    self.record_success()
+                    raise
+                self.record_failure(e if str(e) else type(e).__name__)
+                attempt += 1
+                delay = self.retry_delay(attempt)
+                if delay is None:
+                    raise
+                span_note(retries=1)
+                await asyncio.sleep(delay)
+                continue
+            self.record_success()
+            return result
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self._state(), "attempts": self.attempts, "retries": self.retries,
+                    "rejected": self.rejected}
+
+    def _announce(self, text):
+        print(text)
+        if self.name != "telegram":  # Telegram's own breaker cannot report through Telegram
+            send_telegram(text)
+
+def _policy_from_env(name, policy):
+    """SERVICE_POLICY_<NAME>="timeout=20,retries=1,cooldown=600" overrides single fields."""
+    for part in filter(None, os.getenv(f"SERVICE_POLICY_{name.upper()}", "").split(",")):
+        key, _, value = part.partition("=")
+        key = key.strip()
+        if not hasattr(policy, key):
+            print(f"⚠️ SERVICE_POLICY_{name.upper()}: unknown field {key!r} ignored")
+            continue
+        default, cast = getattr(policy, key), ServicePolicy.__annotations__[key]  # the declared type, not the default's
         try:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-            payload = {"chat_id": TELEGRAM_CHAT_ID, "text": msg, "parse_mode": "Markdown"}
-            requests.post(url, data=payload)
-        except Exception as e:
-            print(f"⚠️ Telegram error: {e}")
+            setattr(policy, key, cast(value.strip()))
+        except ValueError:
+            print(f"⚠️ SERVICE_POLICY_{name.upper()}: {key}={value!r} is not a valid "
+                  f"{cast.__name__}; keeping {default}")
+    return policy
+
+SERVICE_GUARDS = {
+    name: ServiceGuard(name, _policy_from_env(name, policy))
+    for name, policy in {
+        "telegram": ServicePolicy(TELEGRAM_TIMEOUT, retries=2, base_delay=1, max_delay=10,
+                                  failure_threshold=5, cooldown=120),
+        "openai": ServicePolicy(TITLE_TIMEOUT, retries=1, base_delay=1, max_delay=5,
+                                failure_threshold=3, cooldown=300),
+        "trends": ServicePolicy(TRENDS_TIMEOUT, retries=2, base_delay=2, max_delay=8,
+                                failure_threshold=2, cooldown=TRENDS_RETRY_SECONDS),
+        "youtube": ServicePolicy(YOUTUBE_TIMEOUT, retries=UPLOAD_MAX_RETRIES, base_delay=UPLOAD_RETRY_BASE_DELAY,
+                                 max_delay=60, failure_threshold=5, cooldown=300),
+    }.items()
+}
+
+def service_guard(name):
+    return SERVICE_GUARDS[name]
+
+
+class TelegramNotifier:
+    """
+    Background Telegram sender. Callers only enqueue; one daemon thread posts
+    over a pooled keep-alive session with timeouts, merges bursts of text
+    messages into one, and spaces requests to stay under Telegram's rate limit.
+    """
 
-def determine_category_id(caption: str) -> str:
-    caption_lower = caption.lower()
-    if any(kw in caption_lower for kw in ["hack", "wifi", "nmap", "bug", "exploit", "payload", "malware", "phishing", "ethical", "osint"]):
-        return "26"  # How-to & Style
-    if any(kw in caption_lower for kw in ["tutorial", "learn", "how to", "guide", "class", "course", "lesson"]):
-        return "27"  # Education
-    if any(kw in caption_lower for kw in ["review", "setup", "tech", "gadget", "automation", "linux", "ai", "tools", "app", "code", "script"]):
-        return "28"  # Science & Tech
-    return "22"  # Default
-
-def load_processed():
-    if PROCESSED_FILE.exists():
+    def __init__(self, token, chat_id):
+        self.token = token
+        self.chat_id = chat_id
+        self.enabled = bool(token and chat_id)
+        self._queue = queue.Queue()
+        self._session = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._last_post = 0.0
+
+    def _start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2)
+            self._session.mount("https://", adapter)
+            self._thread = threading.Thread(target=self._run, name="telegram-notifier", daemon=True)
+            self._thread.start()
+
+    def send(self, text):
+        if not self.enabled:
+            return
+        self._start()
+        self._queue.put(("text", text))
+
+    def send_file(self, method, field_name, path, caption):
+        """Queue a sendDocument/sendPhoto; the file is read now so it may be deleted afterwards."""
+        if not self.enabled:
+            return
         try:
-            return set(json.loads(PROCESSED_FILE.read_text(encoding="utf-8")))
+            data = Path(path).read_bytes()
         except Exception as e:
-            send_telegram(f"❌ Error loading processed JSON: {e}")
-    return set()
+            print(f"⚠️ Telegram attachment unreadable ({path}): {e}")
+            return
+        self._start()
+        self._queue.put(("file", (method, field_name, Path(path).name, data, caption)))
+
+    def flush(self, timeout=TELEGRAM_FLUSH_TIMEOUT):
+        """Wait up to `timeout` seconds for everything queued so far to be sent (or dropped)."""
+        if not (self._thread and self._thread.is_alive()):
+            return True
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"⚠️ Telegram flush timed out with {self._queue.unfinished_tasks} message(s) unsent")
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout=TELEGRAM_TIMEOUT * 3):
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self):
+        pending = None  # an item read while coalescing that still needs handling
+        while True:
+            item = pending if pending is not None else self._queue.get()
+            pending = None
+            if item is None:
+                self._queue.task_done()
+                return
+            taken = 1  # queue items consumed by this round, each owed a task_done()
+            try:
+                kind, payload = item
+                if kind == "file":
+                    self._post_file(*payload)
+                    continue
+
+                # Coalesce a burst of text messages into as few posts as possible
+                texts = [payload]
+                deadline = time.monotonic() + TELEGRAM_COALESCE_SECONDS
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        nxt = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if nxt is not None and nxt[0] == "text":
+                        texts.append(nxt[1])
+                        taken += 1
+                    else:
+                        pending = nxt
+                        break
+                for chunk in self._batches(texts):
+                    self._post_text(chunk)
+            except Exception as e:
+                # Never let one bad message kill the sender: flush() would wait on it forever
+                print(f"⚠️ Telegram notifier error ({type(e).__name__}: {e}); {taken} message(s) dropped")
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+            # A file or stop marker read while coalescing is handled (and marked done) next
+
+    @staticmethod
+    def _batches(texts):
+        batch = ""
+        for text in texts:
+            if len(text) > TELEGRAM_MAX_TEXT:
+                text = text[:TELEGRAM_MAX_TEXT - 1] + "…"
+            if batch and len(batch) + 2 + len(text) > TELEGRAM_MAX_TEXT:
+                yield batch
+                batch = ""
+            batch = f"{batch}\n\n{text}" if batch else text
+        if batch:
+            yield batch
+
+    def _post(self, method, data, files=None):
+        """POST through the telegram ServiceGuard: 429s wait retry_after, 5xx/network errors use the retry budget."""
+        url = f"{TELEGRAM_API_BASE}/bot{self.token}/{method}"
+        guard = service_guard("telegram")
+        failures = rate_limited = 0
+        while True:
+            if not guard.allow():
+                print(f"📴 Telegram unavailable (circuit open): {method} dropped")
+                return None
+            wait = self._last_post + TELEGRAM_MIN_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_post = time.monotonic()
+            try:
+                resp = self._session.post(url, data=data, files=files, timeout=guard.policy.timeout)
+                error = f"HTTP {resp.status_code}" if resp.status_code >= 500 else None
+            except requests.RequestException as e:
+                resp, error = None, e
+            if error is None:
+                guard.record_success()
+                if resp.status_code != 429:
+                    return resp
+                rate_limited += 1
+                if rate_limited >= 3:
+                    print("⚠️ Telegram rate limit: message dropped")
+                    return None
+                try:
+                    retry_after = resp.json().get("parameters", {}).get("retry_after", 1)
+                except ValueError:
+                    retry_after = 1
+                time.sleep(min(float(retry_after), 30))
+                continue
+            guard.record_failure(error)
+            failures += 1
+            delay = guard.retry_delay(failures)
+            if delay is None:
+                print(f"⚠️ Telegram error: {error}")
+                return resp
+            time.sleep(delay)
 
-def save_processed(processed_set):
+    def _post_text(self, text):
+        data = {"chat_id": self.chat_id, "text": text, "parse_mode": "Markdown"}
+        resp = self._post("sendMessage", data)
+        if resp is not None and resp.status_code == 400:
+            # Merged messages can produce unbalanced Markdown; resend as plain text
+            data.pop("parse_mode")
+            resp = self._post("sendMessage", data)
+        if resp is not None and not resp.ok:
+            print(f"⚠️ Telegram error: HTTP {resp.status_code} {resp.text[:200]}")
+
+    def _post_file(self, method, field_name, filename, content, caption):
+        data = {"chat_id": self.chat_id, "caption": caption}
+        resp = self._post(method, data, files={field_name: (filename, content)})
+        if resp is not None and not resp.ok:
+            print(f"⚠️ Telegram {method} error: HTTP {resp.status_code} {resp.text[:200]}")
+
+notifier = TelegramNotifier(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+atexit.register(notifier.close)
+
+def send_telegram(msg):
+    notifier.send(msg)
+
+# ---------------------- Instrumentation ----------------------
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Instrumentation:
+    """
+    Lightweight per-run spans: stage, wall time, bytes transferred, retries and
+    outcome. Written out as a JSON run report plus a Prometheus textfile.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        record = {"stage": stage, "start": time.time(), "seconds": 0.0, "bytes": 0, "retries": 0,
+                  "outcome": "ok", **attrs}
+        token = _current_span.set(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["outcome"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 4)
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(record)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.spans)
+
+instrumentation = Instrumentation()
+
+def span_note(**fields):
+    """Annotate the innermost open span; `bytes`/`retries` accumulate, other fields overwrite."""
+    record = _current_span.get()
+    if record is None:
+        return
+    for key, value in fields.items():
+        if key in ("bytes", "retries"):
+            record[key] += value
+        else:
+            record[key] = value
+
+def instrumented(stage, ok=bool, size=None):
+    """
+    Record a span around every call. `ok(result)` False marks the outcome "failed"
+    (for functions that report failure by return value); `size(result, *args,
+    **kwargs)` gives the bytes transferred.
+    """
+    def finish(record, result, args, kwargs):
+        if record["outcome"] == "ok" and not ok(result):
+            record["outcome"] = "failed"
+        if size and result:
+            try:
+                record["bytes"] += int(size(result, *args, **kwargs) or 0)
+            except Exception:
+                pass
+
+    def wrap(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with instrumentation.span(stage) as record:
+                    result = await fn(*args, **kwargs)
+                    finish(record, result, args, kwargs)
+                    return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with instrumentation.span(stage) as record:
+                result = fn(*args, **kwargs)
+                finish(record, result, args, kwargs)
+                return result
+        return wrapper
+    return wrap
+
+def _percentile(values, q):
+    """Linear-interpolated percentile (q in 0..100) of a non-empty list."""
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    lo, hi = int(pos), min(int(pos) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+def summarize_spans(spans):
+    """{stage: {count, failures, retries, bytes, seconds_sum, p50, p95}}"""
+    by_stage = {}
+    for span in spans:
+        by_stage.setdefault(span["stage"], []).append(span)
+    summary = {}
+    for stage, items in sorted(by_stage.items()):
+        seconds = [i["seconds"] for i in items]
+        summary[stage] = {
+            "count": len(items),
+            "failures": sum(1 for i in items if i["outcome"] in ("failed", "error")),
+            "retries": sum(i["retries"] for i in items),
+            "bytes": sum(i["bytes"] for i in items),
+            "seconds_sum": round(sum(seconds), 4),
+            "p50": round(_percentile(seconds, 50), 4),
+            "p95": round(_percentile(seconds, 95), 4),
+        }
+    return summary
+
+def _prom_labels(**labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+def write_prometheus_textfile(report, path):
+    """node_exporter textfile-collector format, written atomically."""
+    lines = [
+        "# HELP ig2yt_stage_seconds Wall time per instrumented call.",
+        "# TYPE ig2yt_stage_seconds summary",
+    ]
+    for stage, st in report["stages"].items():
+        lines.append(f"ig2yt_stage_seconds{_prom_labels(stage=stage, quantile='0.5')} {st['p50']}")
+        lines.append(f"ig2yt_stage_seconds{_prom_labels(stage=stage, quantile='0.95')} {st['p95']}")
+        lines.append(f"ig2yt_stage_seconds_sum{_prom_labels(stage=stage)} {st['seconds_sum']}")
+        lines.append(f"ig2yt_stage_seconds_count{_prom_labels(stage=stage)} {st['count']}")
+    for metric, key, help_text in (
+        ("ig2yt_stage_bytes", "bytes", "Bytes transferred per stage in the last run."),
+        ("ig2yt_stage_retries", "retries", "Retries per stage in the last run."),
+        ("ig2yt_stage_failures", "failures", "Failed calls per stage in the last run."),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        lines += [f"{metric}{_prom_labels(stage=stage)} {st[key]}" for stage, st in report["stages"].items()]
+    lines += [
+        "# HELP ig2yt_reels Reels handled in the last run by profile and result.",
+        "# TYPE ig2yt_reels gauge",
+    ]
+    for profile, counts in report.get("results", {}).items():
+        for result, count in counts.items():
+            lines.append(f"ig2yt_reels{_prom_labels(profile=profile, result=result)} {count}")
+    if report.get("resources"):
+        lines += [
+            "# HELP ig2yt_resource_bytes Peak memory and media disk use in the last run.",
+            "# TYPE ig2yt_resource_bytes gauge",
+        ]
+        lines += [f"ig2yt_resource_bytes{_prom_labels(kind=kind)} {value}" for kind, value in report["resources"].items()]
+    lines += [
+        "# HELP ig2yt_run_duration_seconds Wall time of the last run.",
+        "# TYPE ig2yt_run_duration_seconds gauge",
+        f"ig2yt_run_duration_seconds {report['run_seconds']}",
+        "# HELP ig2yt_last_run_timestamp_seconds Unix time the last run finished.",
+        "# TYPE ig2yt_last_run_timestamp_seconds gauge",
+        f"ig2yt_last_run_timestamp_seconds {report['finished_at']}",
+    ]
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+def _current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return _max_rss_bytes()
+
+def _max_rss_bytes(children=False):
+    """Peak RSS from getrusage (children: the largest reaped child process); 0 where unavailable."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+def _dir_bytes(path):
+    total = 0
     try:
-        PROCESSED_FILE.write_text(json.dumps(sorted(list(processed_set)), indent=2), encoding="utf-8")
-        if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendDocument"
-            with open(PROCESSED_FILE, "rb") as f:
-                files = {"document": f}
-                data = {"chat_id": TELEGRAM_CHAT_ID, "caption": "📄 Updated processed_reels.json"}
-                requests.post(url, files=files, data=data)
+        for entry in os.scandir(path):
+            if entry.is_file(follow_symlinks=False):
+                total += entry.stat(follow_symlinks=False).st_size
+            elif entry.is_dir(follow_symlinks=False):
+                total += _dir_bytes(entry.path)
+    except OSError:
+        pass
+    return total
+
+class ResourceMeter:
+    """
+    Peak memory and media disk use over one run, sampled on a background thread:
+    this process's RSS and the bytes under the media directories (partial
+    downloads included). Also takes peaks reported by callers via observe().
+    """
+
+    def __init__(self, dirs, interval=RESOURCE_SAMPLE_SECONDS):
+        self.dirs = dirs
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.disk_start = 0
+        self.peaks = {}
+
+    def _disk_bytes(self):
+        return sum(_dir_bytes(d) for d in self.dirs)
+
+    def observe(self, key, value):
+        with self._lock:
+            self.peaks[key] = max(self.peaks.get(key, 0), value)
+
+    def _sample(self):
+        self.observe("rss_peak_bytes", _current_rss_bytes())
+        self.observe("disk_peak_bytes", self._disk_bytes())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():  # a previous cycle raised before stop()
+            self._stop.set()
+            self._thread.join()
+        with self._lock:
+            self.peaks = {}
+        self.disk_start = self._disk_bytes()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-meter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and return the peaks in bytes."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self._sample()
+        with self._lock:
+            peaks = dict(self.peaks)
+        return {"disk_start_bytes": self.disk_start, **peaks, "children_rss_peak_bytes": _max_rss_bytes(children=True)}
+
+resource_meter = ResourceMeter([DOWNLOAD_DIR, NORMALIZE_CACHE_DIR, THUMBNAIL_DIR])
+
+def format_resources(resources):
+    mb = lambda key: resources.get(key, 0) / 1048576
+    text = (f"📈 Peak memory {mb('rss_peak_bytes'):.0f} MB | media disk {mb('disk_peak_bytes'):.0f} MB "
+            f"(+{max(0.0, mb('disk_peak_bytes') - mb('disk_start_bytes')):.0f} MB this run)")
+    if resources.get("stream_buffer_peak_bytes"):
+        text += f" | stream buffer {mb('stream_buffer_peak_bytes'):.1f} MB"
+    return text
+
+def write_run_report(results=None, resources=None):
+    """Write this run's JSON report and Prometheus textfile; returns the report."""
+    finished = time.time()
+    spans = instrumentation.snapshot()
+    report = {
+        "started_at": instrumentation.started_at,
+        "finished_at": round(finished, 3),
+        "run_seconds": round(finished - instrumentation.started_at, 3),
+        "results": results or {},
+        "stages": summarize_spans(spans),
+        "services": {name: guard.snapshot() for name, guard in SERVICE_GUARDS.items()},
+        "resources": resources or {},
+        "spans": spans,
+    }
+    try:
+        RUN_REPORT_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.fromtimestamp(instrumentation.started_at).strftime("%Y%m%d-%H%M%S")
+        (RUN_REPORT_DIR / f"run-{stamp}.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+        for old in sorted(RUN_REPORT_DIR.glob("run-*.json"))[:-RUN_REPORT_KEEP]:
+            old.unlink()
+        write_prometheus_textfile(report, METRICS_FILE)
     except Exception as e:
-        send_telegram(f"❌ Failed to save processed file: {e}")
+        print(f"⚠️ Could not write run report: {e}")
+    return report
+
+def recent_stage_percentiles(limit=None):
+    """Per-stage p50/p95 over the spans of the most recent run reports."""
+    spans = []
+    runs = 0
+    for path in sorted(RUN_REPORT_DIR.glob("run-*.json"))[-(limit or RUN_REPORT_HISTORY):]:
+        try:
+            spans += json.loads(path.read_text(encoding="utf-8")).get("spans", [])
+            runs += 1
+        except Exception:
+            continue
+    return runs, summarize_spans(spans)
 
-def extract_keywords(text, count=2):
-    words = re.findall(r"\b[a-zA-Z0-9]{3,}\b", text.lower())
+def send_timing_summary():
+    runs, stages = recent_stage_percentiles()
+    if not stages:
+        return
+    lines = [f"⏱️ Stage timings, last {runs} run(s) (p50 / p95):"]
+    for stage, st in sorted(stages.items(), key=lambda kv: -kv[1]["p95"]):
+        lines.append(f"• {stage}: {st['p50']:.1f}s / {st['p95']:.1f}s (n={st['count']})")
+    send_telegram("\n".join(lines))
+
+# ---------------------- Caption analysis ----------------------
+# Keywords match as plain substrings of the lowercased text ("ai" also hits "email")
+CATEGORY_RULES = (  # first rule with a hit wins
+    ("26", ("hack", "wifi", "nmap", "bug", "exploit", "payload", "malware", "phishing", "ethical", "osint")),  # How-to & Style
+    ("27", ("tutorial", "learn", "how to", "guide", "class", "course", "lesson")),  # Education
+    ("28", ("review", "setup", "tech", "gadget", "automation", "linux", "ai", "tools", "app", "code", "script")),  # Science & Tech
+)
+DEFAULT_CATEGORY_ID = "22"
+NICHE_HASHTAG_KEYWORDS = ("hack", "hacking", "cyber", "security", "bug", "tech", "ai", "automation", "linux", "tools")
+NICHE_TREND_KEYWORDS = ("tech", "hack", "cyber", "ai", "app", "gadget", "phone", "security", "linux", "tools")
+MAX_KEPT_HASHTAGS = 3
+
+_TAG_OR_MENTION_RE = re.compile(r"[#@]\w+")
+_HASHTAG_RE = re.compile(r"#\w+")
+_HASHTAG_OR_SEP_RE = re.compile(r"#\w+|\x00")
+_WORD_RE = re.compile(r"\b[a-zA-Z0-9]{3,}\b")
+
+@functools.lru_cache(maxsize=32)
+def _keyword_pattern(keywords):
+    """One compiled alternation for a keyword set, longest first; search() stops at the first hit."""
+    return re.compile("|".join(map(re.escape, sorted(keywords, key=len, reverse=True))))
+
+_TOP_K_HEAP_MIN = 200  # distinct words from which a heap beats sorting everything
+
+def top_words(text, count):
+    """
+    The `count` most frequent non-stopwords of `text`; ties keep first-seen order.
+    Long texts use a heap top-k (same result as the sort), short ones a plain sort.
+    """
     freq = {}
-    for w in words:
-        if w in _STOPWORDS:
+    for w in _WORD_RE.findall(text.lower()):
+        if w not in _STOPWORDS:
+            freq[w] = freq.get(w, 0) + 1
+    if len(freq) >= _TOP_K_HEAP_MIN:
+        return heapq.nlargest(count, freq, key=freq.get)
+    return sorted(freq, key=freq.get, reverse=True)[:count]
+
+@dataclass(frozen=True)
+class CaptionAnalysis:
+    caption: str  # hashtags and @mentions stripped
+    niche_tags: tuple  # up to MAX_KEPT_HASHTAGS niche hashtags, first occurrence order
+
+    @property
+    def category_id(self):
+        """Category of the stripped caption, worked out only when asked for."""
+        return CaptionAnalyzer.category_id(self.caption)
+
+    def top_keywords(self, count):
+        """The `count` most frequent non-stopwords of the caption; ties keep first-occurrence order."""
+        return top_words(self.caption, count)
+
+def _contains_any(text, keywords):
+    for kw in keywords:
+        if kw in text:
+            return True
+    return False
+
+class CaptionAnalyzer:
+    """
+    Niche keyword sets compiled once into one pattern each, category rules
+    checked in order, and a cache of recent results: the same caption is
+    analysed for its title, its download and its metadata. Batches share one
+    regex pass; a single caption is analysed on its own.
+    """
+
+    def __init__(self, cache_size=512):
+        self._patterns = {"hashtag": _keyword_pattern(NICHE_HASHTAG_KEYWORDS),
+                          "trend": _keyword_pattern(NICHE_TREND_KEYWORDS)}
+        self._niche_tag = {}  # hashtag -> bool; tags repeat a lot across captions
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def matches(self, text, group):
+        return self._patterns[group].search(text.lower()) is not None
+
+    @staticmethod
+    def category_id(text):
+        lowered = text.lower()
+        for cid, keywords in CATEGORY_RULES:
+            if _contains_any(lowered, keywords):
+                return cid
+        return DEFAULT_CATEGORY_ID
+
+    def is_niche_tag(self, tag):
+        niche = self._niche_tag.get(tag)
+        if niche is None:
+            if len(self._niche_tag) > 4 * self._cache_size:
+                self._niche_tag.clear()
+            niche = self._niche_tag[tag] = self.matches(tag, "hashtag")
+        return niche
+
+    def analyze(self, caption):
+        analysis = self._cache.get(caption)  # a plain dict read; no lock needed
+        if analysis is None:
+            analysis = self._analyze_one(caption)
+            self._remember({caption: analysis})
+        return analysis
+
+    def analyze_many(self, captions):
+        """CaptionAnalysis per caption; the uncached ones are analysed together in one pass."""
+        with self._lock:
+            results = [self._cache.get(c) for c in captions]
+        todo = list(dict.fromkeys(c for c, r in zip(captions, results) if r is None))
+        if todo:
+            if len(todo) == 1:
+                fresh = {todo[0]: self._analyze_one(todo[0])}
+            else:
+                fresh = dict(zip(todo, self._analyze_batch(todo)))
+            self._remember(fresh)
+            results = [r if r is not None else fresh[c] for c, r in zip(captions, results)]
+        return results
+
+    def _remember(self, fresh):
+        with self._lock:
+            for caption, analysis in fresh.items():
+                self._cache[caption] = analysis
+                self._cache.move_to_end(caption)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _analyze_one(self, caption):
+        caption = caption.strip().replace("\0", "")  # as in a batch, so both paths cache the same result
+        tags = [tag for tag in _HASHTAG_RE.findall(caption) if self.is_niche_tag(tag)]
+        return CaptionAnalysis(_TAG_OR_MENTION_RE.sub("", caption).strip(),
+                               tuple(list(dict.fromkeys(tags))[:MAX_KEPT_HASHTAGS]))
+
+    def _analyze_batch(self, captions):
+        # NUL separates captions, so each regex runs once over the whole batch
+        joined = "\0".join(c.strip().replace("\0", "") for c in captions)
+        cleaned = [c.strip() for c in _TAG_OR_MENTION_RE.sub("", joined).split("\0")]
+        tags = [[]]
+        for token in _HASHTAG_OR_SEP_RE.findall(joined):
+            if token == "\0":
+                tags.append([])
+            elif self.is_niche_tag(token):
+                tags[-1].append(token)
+        return [
+            CaptionAnalysis(clean, tuple(list(dict.fromkeys(tag_list))[:MAX_KEPT_HASHTAGS]))
+            for clean, tag_list in zip(cleaned, tags)
+        ]
+
+caption_analyzer = CaptionAnalyzer()
+
+def determine_category_id(caption: str) -> str:
+    return caption_analyzer.category_id(caption)
+
+# ---------------------- Processed-reel state ----------------------
+_SHORTCODE_RE = re.compile(r"/(?:reels?|p|tv)/([A-Za-z0-9_-]+)")
+
+def normalize_shortcode(value: str) -> str:
+    """Bare shortcode from a reel URL (any profile prefix, query or trailing slash) or a shortcode."""
+    value = (value or "").strip()
+    m = _SHORTCODE_RE.search(value)
+    return m.group(1) if m else value.split("?")[0].strip("/").split("/")[-1]
+
+class StateStore:
+    """
+    SQLite-backed history of reels, keyed by normalized shortcode.
+    Replaces the processed_reels.json set: lookups/inserts hit the primary key
+    index, and only rows changed since the last sync are exported.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS reels (
+            shortcode  TEXT PRIMARY KEY,
+            profile    TEXT,
+            url        TEXT,
+            video_id   TEXT,
+            status     TEXT NOT NULL,
+            reason     TEXT,
+            first_seen REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS reels_updated_at ON reels(updated_at);
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS quota_ledger (
+            id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            project TEXT NOT NULL,
+            day     TEXT NOT NULL,
+            method  TEXT NOT NULL,
+            units   INTEGER NOT NULL,
+            ts      REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS quota_ledger_day ON quota_ledger(project, day);
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            shortcode     TEXT PRIMARY KEY,
+            video_path    TEXT NOT NULL,
+            size          INTEGER NOT NULL,
+            resumable_uri TEXT NOT NULL,
+            progress      INTEGER NOT NULL,
+            created_at    REAL NOT NULL,
+            updated_at    REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS media_cache (
+            shortcode  TEXT PRIMARY KEY,
+            path       TEXT NOT NULL,
+            size       INTEGER NOT NULL,
+            sha256     TEXT NOT NULL,
+            info       TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used  REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS media_cache_last_used ON media_cache(last_used);
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            shortcode  TEXT PRIMARY KEY,
+            video_id   TEXT,
+            hashes     TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS leases (
+            name       TEXT PRIMARY KEY,
+            owner      TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.journal_mode = self._conn.execute(f"PRAGMA journal_mode={STATE_JOURNAL_MODE}").fetchone()[0].lower()
+        # WAL stays consistent with NORMAL; a rollback journal needs FULL to survive a crash mid-commit
+        self._conn.execute("PRAGMA synchronous=" + ("NORMAL" if self.journal_mode == "wal" else "FULL"))
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(reels)")}
+        if "reason" not in columns:  # databases created before skipped reels were recorded
+            self._conn.execute("ALTER TABLE reels ADD COLUMN reason TEXT")
+        self._conn.commit()
+
+    def close(self):
+        """Fold the WAL back into the database file first, so copying STATE_DB alone keeps every row."""
+        with self._lock:
+            if self._conn is None:
+                return
+            if self.journal_mode == "wal":
+                try:
+                    self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except sqlite3.Error as e:
+                    print(f"⚠️ State DB checkpoint failed: {e}")
+            self._conn.close()
+            self._conn = None
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, str(value)),
+            )
+
+    def is_processed(self, shortcode) -> bool:
+        """Uploaded, rejected as a duplicate or skipped as ineligible: never a candidate again."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM reels WHERE shortcode = ? AND status IN ('uploaded', 'duplicate', 'skipped')",
+                (normalize_shortcode(shortcode),),
+            ).fetchone()
+        return row is not None
+
+    def record(self, shortcode, status, profile=None, url=None, video_id=None, reason=None):
+        """Insert or update one reel; None fields keep their stored value, except `reason`, which goes with the status."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO reels(shortcode, profile, url, video_id, status, reason, first_seen, updated_at)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(shortcode) DO UPDATE SET
+                    profile    = COALESCE(excluded.profile, reels.profile),
+                    url        = COALESCE(excluded.url, reels.url),
+                    video_id   = COALESCE(excluded.video_id, reels.video_id),
+                    status     = excluded.status,
+                    reason     = excluded.reason,
+                    updated_at = excluded.updated_at
+                """,
+                (normalize_shortcode(shortcode), profile, url, video_id, status, reason, now, now),
+            )
+
+    def count(self, status="uploaded"):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reels WHERE status = ?", (status,)).fetchone()[0]
+
+    def migrate_legacy_json(self, path):
+        """
+        Import processed_reels.json (URLs or bare shortcodes) once per file content.
+        Signed by a hash of the bytes: a fresh checkout changes the mtime on every run.
+        """
+        path = Path(path)
+        if not path.exists():
+            return 0
+        data = path.read_bytes()
+        signature = "sha256:" + hashlib.sha256(data).hexdigest()
+        if self.get_meta("legacy_json_signature") == signature:
+            return 0
+        entries = json.loads(data.decode("utf-8"))
+        now = time.time()
+        rows = []
+        for entry in entries:
+            if not isinstance(entry, str) or not entry.strip():
+                continue
+            m = re.search(r"instagram\.com/([^/]+)/(?:reels?|p)/", entry)
+            profile = m.group(1) if m else None
+            url = entry if entry.startswith("http") else None
+            rows.append((normalize_shortcode(entry), profile, url, "uploaded", now, now))
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO reels(shortcode, profile, url, status, first_seen, updated_at) "
+                "VALUES(?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            imported = self._conn.total_changes - before
+        self.set_meta("legacy_json_signature", signature)
+        return imported
+
+    def get_upload_session(self, shortcode):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT video_path, size, resumable_uri, progress, created_at FROM upload_sessions WHERE shortcode = ?",
+                (normalize_shortcode(shortcode),),
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("video_path", "size", "resumable_uri", "progress", "created_at"), row))
+
+    def save_upload_session(self, shortcode, video_path, size, resumable_uri, progress):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO upload_sessions(shortcode, video_path, size, resumable_uri, progress, created_at, updated_at)
+                VALUES(?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(shortcode) DO UPDATE SET
+                    resumable_uri = excluded.resumable_uri,
+                    progress      = excluded.progress,
+                    updated_at    = excluded.updated_at
+                """,
+                (normalize_shortcode(shortcode), str(video_path), size, resumable_uri, progress, now, now),
+            )
+
+    def upload_session_paths(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT video_path FROM upload_sessions")]
+
+    def clear_upload_session(self, shortcode):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM upload_sessions WHERE shortcode = ?", (normalize_shortcode(shortcode),))
+
+    def add_fingerprint(self, shortcode, video_id, hashes):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints(shortcode, video_id, hashes, created_at) VALUES(?, ?, ?, ?)",
+                (normalize_shortcode(shortcode), video_id, " ".join(f"{h:016x}" for h in hashes), time.time()),
+            )
+
+    def all_fingerprints(self):
+        """[(shortcode, [frame hashes]), ...] of every fingerprinted upload."""
+        with self._lock:
+            rows = self._conn.execute("SELECT shortcode, hashes FROM fingerprints").fetchall()
+        return [(code, [int(h, 16) for h in hashes.split()]) for code, hashes in rows]
+
+    def acquire_lease(self, name, owner, ttl):
+        """Take (or renew) a named lease atomically. False while someone else holds an unexpired one."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO leases(name, owner, expires_at) VALUES(?, ?, 0)", (name, owner))
+            cur = self._conn.execute(
+                "UPDATE leases SET owner = ?, expires_at = ? WHERE name = ? AND (owner = ? OR expires_at < ?)",
+                (owner, now + ttl, name, owner, now),
+            )
+            return cur.rowcount == 1
+
+    def release_lease(self, name, owner):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def get_cached_media(self, shortcode):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, size, sha256, info FROM media_cache WHERE shortcode = ?",
+                (normalize_shortcode(shortcode),),
+            ).fetchone()
+        if not row:
+            return None
+        return {"path": row[0], "size": row[1], "sha256": row[2], "info": json.loads(row[3])}
+
+    def put_cached_media(self, shortcode, path, size, sha256, info):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO media_cache(shortcode, path, size, sha256, info, created_at, last_used)
+                VALUES(?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(shortcode) DO UPDATE SET
+                    path = excluded.path, size = excluded.size, sha256 = excluded.sha256,
+                    info = excluded.info, last_used = excluded.last_used
+                """,
+                (normalize_shortcode(shortcode), str(path), size, sha256, json.dumps(info), now, now),
+            )
+
+    def touch_cached_media(self, shortcode):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE media_cache SET last_used = ? WHERE shortcode = ?", (time.time(), normalize_shortcode(shortcode))
+            )
+
+    def drop_cached_media(self, shortcode):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM media_cache WHERE shortcode = ?", (normalize_shortcode(shortcode),))
+
+    def cached_media_lru(self):
+        """[(shortcode, path, size, last_used), ...], least recently used first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT shortcode, path, size, last_used FROM media_cache ORDER BY last_used"
+            ).fetchall()
+
+    def add_quota_usage(self, project, day, method, units):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO quota_ledger(project, day, method, units, ts) VALUES(?, ?, ?, ?, ?)",
+                (project, day, method, units, time.time()),
+            )
+
+    def quota_used(self, project, day):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(units), 0) FROM quota_ledger WHERE project = ? AND day = ?", (project, day)
+            ).fetchone()
+        return row[0]
+
+    def changes_since(self, ts):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT shortcode, profile, url, video_id, status, reason, first_seen, updated_at "
+                "FROM reels WHERE updated_at > ? ORDER BY updated_at",
+                (ts,),
+            ).fetchall()
+        keys = ("shortcode", "profile", "url", "video_id", "status", "reason", "first_seen", "updated_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+def open_state_store():
+    store = StateStore(STATE_DB)
+    atexit.register(store.close)  # checkpoint even when a run ends on an unhandled error
+    try:
+        imported = store.migrate_legacy_json(PROCESSED_FILE)
+        if imported:
+            send_telegram(f"🗃️ Migrated {imported} reels from {PROCESSED_FILE} into {STATE_DB}")
+    except Exception as e:
+        send_telegram(f"❌ Error migrating processed JSON: {e}")
+    return store
+
+def sync_state(store):
+    """Send only the rows changed since the previous sync to Telegram."""
+    try:
+        last_sync = float(store.get_meta("last_sync", 0.0))
+        changes = store.changes_since(last_sync)
+        if not changes:
+            return
+        delta_file = Path(f"processed_delta_{int(time.time())}.json")
+        delta_file.write_text(json.dumps(changes, indent=2), encoding="utf-8")
+        notifier.send_file(
+            "sendDocument", "document", delta_file,
+            f"📄 {len(changes)} reel state change(s) | {store.count()} uploaded in total"
+        )
+        delta_file.unlink()
+        store.set_meta("last_sync", changes[-1]["updated_at"])
+    except Exception as e:
+        send_telegram(f"❌ Failed to sync processed state: {e}")
+
+# ---------------------- YouTube quota ----------------------
+def youtube_project_id():
+    """Quota is per Google Cloud project: take it from client_secrets.json (or YOUTUBE_PROJECT)."""
+    if YOUTUBE_PROJECT:
+        return YOUTUBE_PROJECT
+    for path, sections in ((CLIENT_SECRETS, ("installed", "web")), (TOKEN_FILE, (None,))):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
             continue
-        freq[w] = freq.get(w, 0) + 1
-    return [f"#{w}" for w, _ in sorted(freq.items(), key=lambda x: -x[1])[:count]]
+        for section in sections:
+            entry = data.get(section, {}) if section else data
+            project = entry.get("project_id") or entry.get("client_id")
+            if project:
+                return project
+    return "default"
+
+COMMENT_METHODS = ("commentThreads.insert", "comments.setModerationStatus")
+
+def upload_quota_cost():
+    """Units one reel costs end to end: the upload plus the post-upload calls."""
+    methods = ("videos.insert", *COMMENT_METHODS) + (("thumbnails.set",) if THUMBNAIL_UPLOAD else ())
+    return sum(YOUTUBE_QUOTA_COSTS[m] for m in methods)
+
+def is_quota_error(error):
+    from googleapiclient.errors import HttpError
+    return isinstance(error, HttpError) and b"quotaExceeded" in (error.content or b"")
+
+class QuotaLedger:
+    """
+    Persistent YouTube Data API quota ledger in the state store. Every call is
+    recorded with its unit cost against the project and the Pacific-time day,
+    which is when Google resets the daily quota.
+    """
+
+    def __init__(self, store, project=None, daily_limit=None):
+        self.store = store
+        self.project = project or youtube_project_id()
+        self.daily_limit = daily_limit or YOUTUBE_DAILY_QUOTA
+
+    @staticmethod
+    def today():
+        return datetime.now(PACIFIC_TZ).date().isoformat()
+
+    def record(self, method, units=None):
+        units = YOUTUBE_QUOTA_COSTS.get(method, 1) if units is None else units
+        self.store.add_quota_usage(self.project, self.today(), method, units)
 
+    def used(self):
+        return self.store.quota_used(self.project, self.today())
+
+    def mark_exhausted(self):
+        """YouTube said quotaExceeded: nothing more goes out until the next Pacific day."""
+        self.store.set_meta(f"quota_exhausted:{self.project}", self.today())
+
+    def remaining(self):
+        if self.store.get_meta(f"quota_exhausted:{self.project}") == self.today():
+            return 0
+        return max(0, self.daily_limit - self.used())
+
+    def affordable_uploads(self):
+        return self.remaining() // upload_quota_cost()
+
+    @staticmethod
+    def seconds_until_reset():
+        now = datetime.now(PACIFIC_TZ)
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=PACIFIC_TZ)
+        return max(60.0, (midnight - now).total_seconds())
+
+def extract_keywords(text, count=2):
+    return [f"#{w}" for w in top_words(text, count)]
+
+@instrumented("get_video_probe", ok=lambda probe: probe[0] > 0)
 def get_video_probe(path: str):
     """Return width, height, fps, duration (sec) using ffprobe."""
     try:
@@ -120,42 +1391,133 @@ CACHED_TRENDS = [
     "Linux commands", "Automation tools", "Python", "Nmap", "Kali Linux", "Malware analysis"
 ]
 
-def _fetch_trends_india_raw(max_items=10, retries=3):
-    """Low-level fetch from Google Trends with retries, returns raw list (no filtering)."""
-    delay = 2
-    for attempt in range(1, retries + 1):
+@instrumented("_fetch_trends_india_raw")
+def _fetch_trends_india_raw(max_items=10):
+    """
+    Low-level fetch from Google Trends through the trends ServiceGuard, returns raw
+    list (no filtering). Empty when Trends is failing or its circuit is open.
+    """
+    from pytrends.request import TrendReq  # pulls in pandas; only needed on a cache miss
+    guard = service_guard("trends")
+
+    def fetch():
+        pytrends = TrendReq(hl='en-IN', tz=330, timeout=(5, guard.policy.timeout))
+        df = pytrends.trending_searches(pn='india')
+        items = [t for t in df[0].tolist() if isinstance(t, str)]
+        if not items:
+            raise RuntimeError("empty trends response")
+        return items[:max_items]
+
+    try:
+        return guard.call(fetch)
+    except CircuitOpenError:
+        span_note(outcome="circuit_open")
+    except Exception as e:
+        send_telegram(f"⚠️ Trends fetch failed: {e}")
+    return []
+
+class TrendsCache:
+    """
+    One Google Trends fetch shared by every caller in a run.
+    Results live in memory and in TRENDS_CACHE_FILE; once older than the TTL
+    they are refreshed on a background thread while the stale list keeps serving.
+    """
+
+    def __init__(self, path, ttl_seconds, max_items=20):
+        self.path = Path(path)
+        self.ttl = ttl_seconds
+        self.max_items = max_items
+        self.items = []
+        self.fetched_at = 0.0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._refresher = None
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path.exists():
+            return
         try:
-            pytrends = TrendReq(hl='en-IN', tz=330)
-            df = pytrends.trending_searches(pn='india')
-            items = [t for t in df[0].tolist() if isinstance(t, str)]
-            if items:
-                return items[:max_items]
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.items = [t for t in data.get("items", []) if isinstance(t, str)]
+            self.fetched_at = float(data.get("fetched_at", 0.0))
         except Exception as e:
-            if attempt == retries:
-                send_telegram(f"⚠️ Trends fetch failed after {retries} attempts: {e}")
-                break
-            time.sleep(delay)
-            delay *= 2  # exponential backoff
-    return []
+            print(f"⚠️ Ignoring unreadable trends cache: {e}")
+
+    def _save(self):
+        try:
+            payload = {"fetched_at": self.fetched_at, "items": self.items}
+            self.path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        except Exception as e:
+            print(f"⚠️ Could not write trends cache: {e}")
+
+    def is_stale(self):
+        with self._lock:
+            self._load()
+            return time.time() - self.fetched_at > self.ttl
+
+    def refresh(self):
+        """
+        Fetch live trends now (deduplicated across threads). Keeps old items on
+        failure; the trends circuit breaker spaces out further attempts.
+        """
+        with self._fetch_lock:
+            if not self.is_stale():
+                return  # another thread refreshed while we waited
+            items = _fetch_trends_india_raw(max_items=self.max_items)
+            if items:
+                with self._lock:
+                    self.items = items
+                    self.fetched_at = time.time()
+                    self._save()
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._refresher and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self.refresh, name="trends-refresh", daemon=True)
+            self._refresher.start()
+
+    def get(self):
+        """Raw trend list; only blocks when there is nothing cached at all."""
+        with self._lock:
+            self._load()
+            have_items = bool(self.items)
+        if not have_items:
+            self.refresh()
+        elif self.is_stale():
+            self.refresh_in_background()
+        with self._lock:
+            return list(self.items)
+
+trends_cache = TrendsCache(TRENDS_CACHE_FILE, TRENDS_TTL_SECONDS)
+_trends_announced_at = None
 
 def get_trending_keywords_india(limit=5):
     """
     Return up to `limit` *relevant* trend keywords for hashtagging.
     Filters to your niche; falls back to cached topics when Trends fails.
     """
-    niche_needles = ("tech", "hack", "cyber", "ai", "app", "gadget", "phone", "security", "linux", "tools")
-    raw = _fetch_trends_india_raw(max_items=20, retries=3)
+    global _trends_announced_at
+    raw = trends_cache.get()
     if raw:
-        filtered = [kw for kw in raw if any(n in kw.lower() for n in niche_needles)]
+        filtered = [kw for kw in raw if caption_analyzer.matches(kw, "trend")]
         if not filtered:
             # If nothing matches niche, at least return the top few raw trends
             filtered = raw[:limit]
         chosen = filtered[:limit]
-        send_telegram("📈 Google Trends India (live): " + ", ".join(chosen))
+        if _trends_announced_at != trends_cache.fetched_at:
+            _trends_announced_at = trends_cache.fetched_at
+            send_telegram("📈 Google Trends India (live): " + ", ".join(chosen))
         return chosen
     # Fallback
     fallback = CACHED_TRENDS[:limit]
-    send_telegram("📉 Using cached trends (fallback): " + ", ".join(fallback))
+    if _trends_announced_at != "fallback":
+        _trends_announced_at = "fallback"
+        send_telegram("📉 Using cached trends (fallback): " + ", ".join(fallback))
     return fallback
 
 def get_live_trends(count=5):
@@ -163,14 +1525,14 @@ def get_live_trends(count=5):
     Return up to `count` live trends (unfiltered) for titles.
     Falls back to cached topics when Trends fails.
     """
-    raw = _fetch_trends_india_raw(max_items=count, retries=3)
+    raw = trends_cache.get()
     if raw:
         return raw[:count]
     return CACHED_TRENDS[:count]
 # --- End robust trends ---
 
 def generate_hacking_trending_hashtags(caption, total=8):
-    ig_tags = re.findall(r"#\w+", caption)
+    ig_tags = _HASHTAG_RE.findall(caption)
     ig_tags = list(dict.fromkeys(ig_tags))[:3]  # keep first 3 IG tags
     hacking_tags = ["#ethicalhacking", "#cybersecurity"]
     trending_tags = ["#tech", "#shorts", "#trending", "#automation"]
@@ -198,29 +1560,142 @@ def ensure_exact_hashtags(tags, desired=8):
             break
     return base_pool[:desired]
 
-def generate_thumbnail(text, output_path):
+# ---------------------- Thumbnails ----------------------
+THUMBNAIL_FONT_FALLBACKS = ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",)
+THUMBNAIL_FONT_SIZES = (84, 72, 64, 56, 48, 40)
+THUMBNAIL_MAX_LINES = 4
+
+@functools.lru_cache(maxsize=len(THUMBNAIL_FONT_SIZES))
+def _thumbnail_font(size):
+    """Font objects live as long as the worker process; opening the TTF is the slow part."""
+    from PIL import ImageFont
+    for name in (THUMBNAIL_FONT, *THUMBNAIL_FONT_FALLBACKS):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
     try:
-        THUMBNAIL_DIR.mkdir(exist_ok=True)
-        img = Image.new("RGB", (1280, 720), color=(0, 0, 0))
-        draw = ImageDraw.Draw(img)
+        return ImageFont.load_default(size)  # scalable on Pillow >= 10.1
+    except TypeError:
+        return ImageFont.load_default()
+
+def extract_keyframe(src, at):
+    """
+    The keyframe at or before `at` seconds, scaled to thumbnail height, as a PIL image.
+    Input seeking with -skip_frame nokey jumps straight to it and decodes that one frame.
+    """
+    from PIL import Image
+    cmd = [FFMPEG, "-v", "error", "-skip_frame", "nokey", "-noaccurate_seek", "-ss", f"{at:.2f}",
+           "-i", str(src), "-frames:v", "1", "-vf", f"scale=-2:{THUMBNAIL_SIZE[1]}",
+           "-f", "image2pipe", "-vcodec", "ppm", "-"]
+    out = subprocess.run(cmd, check=True, capture_output=True, timeout=30).stdout
+    return Image.open(io.BytesIO(out)).convert("RGB") if out else None
+
+def pick_keyframe(src, duration, candidates=THUMBNAIL_CANDIDATES):
+    """The most detailed (highest luma spread) of `candidates` keyframes spread over the clip."""
+    from PIL import ImageStat
+    best, best_score = None, -1.0
+    for i in range(candidates):
         try:
-            font = ImageFont.truetype("DejaVuSans-Bold.ttf", 48)
-        except:
-            font = ImageFont.load_default()
-        draw.text((100, 300), text, font=font, fill=(255, 255, 255))
-        img.save(output_path)
-        return output_path
-    except Exception as e:
-        send_telegram(f"❌ Thumbnail error: {e}")
-        return None
+            frame = extract_keyframe(src, duration * (i + 1) / (candidates + 1))
+        except (subprocess.SubprocessError, OSError):
+            continue
+        if frame is None:
+            continue
+        score = ImageStat.Stat(frame.convert("L")).stddev[0]
+        if score > best_score:
+            best, best_score = frame, score
+    return best
+
+def _wrap_text(draw, text, font, max_width):
+    """Greedy word wrap; a single word wider than max_width gets a line of its own."""
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if not line or draw.textlength(candidate, font=font) <= max_width:
+            line = candidate
+        else:
+            lines.append(line)
+            line = word
+    if line:
+        lines.append(line)
+    return lines
+
+def _fit_text(draw, text, width, height):
+    """Largest font size whose wrapped lines fit the box; the smallest size is truncated to fit."""
+    for size in THUMBNAIL_FONT_SIZES:
+        font = _thumbnail_font(size)
+        lines = _wrap_text(draw, text, font, width)
+        line_height = int(size * 1.2)
+        if (len(lines) <= THUMBNAIL_MAX_LINES and len(lines) * line_height <= height
+                and all(draw.textlength(line, font=font) <= width for line in lines)):
+            return font, lines, line_height
+    keep = max(1, min(THUMBNAIL_MAX_LINES, height // line_height))
+    if len(lines) > keep:
+        lines = lines[:keep]
+        lines[-1] = lines[-1].rstrip(".") + "…"
+    return font, lines, line_height
+
+def render_thumbnail(frame, text):
+    """
+    Compose the thumbnail: a blurred, darkened fill of the frame behind the frame
+    itself. Portrait reels sit on the right with the title beside them; wider
+    frames fill the canvas with the title on a band at the bottom.
+    """
+    from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+    width, height = THUMBNAIL_SIZE
+    canvas = Image.new("RGB", THUMBNAIL_SIZE, (0, 0, 0))
+    text_box = (60, 60, width - 60, height - 60)
+    if frame is not None:
+        scale = max(width / frame.width, height / frame.height)
+        fill = frame.resize((round(frame.width * scale), round(frame.height * scale)))
+        left, top = (fill.width - width) // 2, (fill.height - height) // 2
+        fill = fill.crop((left, top, left + width, top + height)).filter(ImageFilter.GaussianBlur(24))
+        canvas.paste(ImageEnhance.Brightness(fill).enhance(0.45))
+        fg = frame.resize((round(frame.width * height / frame.height), height))
+        if fg.width <= width // 2:
+            canvas.paste(fg, (width - fg.width - 60, 0))
+            text_box = (60, 60, width - fg.width - 120, height - 60)
+        else:
+            canvas.paste(fg, ((width - fg.width) // 2, 0))
+            text_box = (60, height * 3 // 5, width - 60, height - 40)
+            band = Image.new("RGB", (width, height - text_box[1] + 20), (0, 0, 0))
+            canvas.paste(Image.blend(canvas.crop((0, text_box[1] - 20, width, height)), band, 0.6),
+                         (0, text_box[1] - 20))
+
+    draw = ImageDraw.Draw(canvas)
+    x0, y0, x1, y1 = text_box
+    font, lines, line_height = _fit_text(draw, text, x1 - x0, y1 - y0)
+    y = y0 + (y1 - y0 - len(lines) * line_height) // 2
+    for line in lines:
+        draw.text((x0, y), line, font=font, fill=(255, 255, 255), stroke_width=3, stroke_fill=(0, 0, 0))
+        y += line_height
+    return canvas
+
+def generate_thumbnail(text, output_path, source=None, duration=0.0):
+    """
+    Write a 1280×720 JPEG for one video to `output_path`: the best keyframe of
+    `source` with `text` (hashtags dropped) wrapped over it, or the text on black
+    when there is no usable frame. Runs in a worker process. Returns the path.
+    """
+    frame = pick_keyframe(source, duration) if source and duration > 0 else None
+    title = re.sub(r"\s*#\w+", "", text).strip() or text
+    image = render_thumbnail(frame, title)
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output_path.with_name(output_path.stem + ".part.jpg")
+    image.save(tmp, "JPEG", quality=90, optimize=True)
+    os.replace(tmp, output_path)
+    return str(output_path)
  
-def fallback_title_from_caption(caption: str) -> str:
+def fallback_title_from_caption(caption: str, trends=None) -> str:
     # Extract keywords from caption
-    words = re.findall(r"\b[a-zA-Z0-9]{3,}\b", caption.lower())
+    words = _WORD_RE.findall(caption.lower())
     filtered = [w for w in words if w not in _STOPWORDS][:3]
 
-    # Fetch live trends
-    trends = get_live_trends(count=3)
+    # Fetch live trends (unless the caller already has them)
+    if trends is None:
+        trends = get_live_trends(count=3)
     trends_part = " ".join(trends)
 
     # Merge caption + trends
@@ -228,39 +1703,152 @@ def fallback_title_from_caption(caption: str) -> str:
     final_title = f"{base} – {trends_part} #shorts".strip()
     return final_title
 
-def generate_ai_title(caption: str) -> str:
-    trends = get_live_trends(count=3)
+def build_title_prompt(caption, trends):
     trends_text = ", ".join(trends) if trends else ""
-    prompt = (
+    return (
         f"Generate a catchy YouTube Shorts title (max 70 characters) for a hacking-themed reel with this caption:\n\n"
         f"{caption}\n\n"
         f"Include at least one of these trending Indian keywords if possible: {trends_text}\n"
         f"Avoid clickbait, keep it smart and tech-focused."
     )
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=50,
-            temperature=0.8
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        send_telegram(f"⚠️ GPT-4 failed → gpt-3.5 fallback\nReason: {e}")
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=50,
-                temperature=0.8
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as ex:
-            send_telegram(f"❌ AI title unavailable → Using caption+trends\nReason: {ex}")
-            return fallback_title_from_caption(caption)
+def _is_openai_outage(error):
+    """Timeouts, connection errors, 429 and 5xx: the API is struggling, not this model or prompt."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
 
-def get_youtube_client():
+class TitleService:
+    """
+    AI titles with a persistent cache keyed by a hash of caption + trends, so a
+    retried reel never pays for a second completion. Titles for a batch are
+    requested concurrently, and each model call has its own timeout so a slow
+    model fails over to the next one quickly.
+    """
+
+    def __init__(self, path, models, timeout, max_entries=500):
+        self.path = Path(path)
+        self.models = models
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._cache = None
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_loop = None
+
+    def _load(self):
+        if self._cache is None:
+            self._cache = {}
+            if self.path.exists():
+                try:
+                    self._cache = json.loads(self.path.read_text(encoding="utf-8"))
+                except Exception as e:
+                    print(f"⚠️ Ignoring unreadable title cache: {e}")
+        return self._cache
+
+    @staticmethod
+    def cache_key(caption, trends):
+        raw = json.dumps([caption.strip(), list(trends or [])], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def cached(self, key):
+        with self._lock:
+            entry = self._load().get(key)
+        return entry["title"] if entry else None
+
+    def _remember(self, key, title, model):
+        with self._lock:
+            cache = self._load()
+            cache[key] = {"title": title, "model": model, "created_at": time.time()}
+            if len(cache) > self.max_entries:
+                for old in sorted(cache, key=lambda k: cache[k]["created_at"])[:len(cache) - self.max_entries]:
+                    del cache[old]
+            try:
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(cache, indent=2, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, self.path)
+            except Exception as e:
+                print(f"⚠️ Could not write title cache: {e}")
+
+    def _get_client(self):
+        # httpx async pools are bound to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(timeout=self.timeout, max_retries=0)
+            self._client_loop = loop
+        return self._client
+
+    @instrumented("generate_ai_title")
+    async def generate(self, caption, trends=None):
+        if trends is None:
+            trends = await asyncio.to_thread(get_live_trends, 3)
+        key = self.cache_key(caption, trends)
+        title = self.cached(key)
+        if title:
+            span_note(outcome="cache_hit")
+            return title
+
+        prompt = build_title_prompt(caption, trends)
+        guard = service_guard("openai")
+        error = None
+        for i, model in enumerate(self.models):
+            try:
+                response = await guard.acall(
+                    lambda: self._get_client().chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=50,
+                        temperature=0.8
+                    ),
+                    retryable=_is_openai_outage,
+                )
+                title = (response.choices[0].message.content or "").strip()
+                if title:
+                    self._remember(key, title, model)
+                    return title
+                error = "empty response"
+            except CircuitOpenError:
+                # Already reported once by the breaker; fall back without waiting or messaging per reel
+                span_note(outcome="circuit_open")
+                return fallback_title_from_caption(caption, trends)
+            except Exception as e:
+                error = e if str(e) else type(e).__name__
+                if _is_openai_outage(e):
+                    break  # the API itself is failing: the next model would fail the same way
+            if i + 1 < len(self.models):
+                span_note(retries=1)
+                send_telegram(f"⚠️ {model} failed → {self.models[i + 1]} fallback\nReason: {error}")
+        span_note(outcome="fallback")
+        send_telegram(f"❌ AI title unavailable → Using caption+trends\nReason: {error}")
+        return fallback_title_from_caption(caption, trends)
+
+    def submit_many(self, captions):
+        """Start titles for every caption at once (TITLE_CONCURRENCY in flight); one task per caption."""
+        trends = asyncio.ensure_future(asyncio.to_thread(get_live_trends, 3))
+        semaphore = asyncio.Semaphore(max(1, TITLE_CONCURRENCY))
+
+        async def one(caption):
+            async with semaphore:
+                return await self.generate(caption, await trends)
+
+        return [asyncio.ensure_future(one(caption)) for caption in captions]
+
+    def generate_blocking(self, caption):
+        """For callers outside the event loop (worker threads)."""
+        return asyncio.run(self.generate(caption))
+
+title_service = TitleService(TITLE_CACHE_FILE, TITLE_MODELS, TITLE_TIMEOUT)
+
+def generate_ai_title(caption: str) -> str:
+    return title_service.generate_blocking(caption)
+
+def _load_youtube_credentials():
+    from google.oauth2.credentials import Credentials
+    from google.auth.transport.requests import Request
     creds = None
     if TOKEN_FILE.exists():
         try:
@@ -280,15 +1868,83 @@ def get_youtube_client():
                 print("❌ client_secrets.json not found. Cannot initiate OAuth flow.")
                 sys.exit(1)
             print("🔑 You need to authorize YouTube access. Starting console flow...")
+            from google_auth_oauthlib.flow import InstalledAppFlow
             flow = InstalledAppFlow.from_client_secrets_file(str(CLIENT_SECRETS), YOUTUBE_SCOPES)
             creds = flow.run_local_server(port=0)
             with open(TOKEN_FILE, "w", encoding="utf-8") as f:
                 f.write(creds.to_json())
             print("✅ New token saved to", TOKEN_FILE)
-    return build("youtube", "v3", credentials=creds)
+    return creds
+
+_youtube_creds = None
+_youtube_creds_lock = threading.Lock()
+_youtube_discovery_doc = None
+_youtube_local = threading.local()
+
+def _youtube_credentials():
+    """Shared credentials for the run, refreshed before they expire rather than on a 401."""
+    global _youtube_creds
+    with _youtube_creds_lock:
+        if _youtube_creds is None:
+            _youtube_creds = _load_youtube_credentials()
+        creds = _youtube_creds
+        now = datetime.now(timezone.utc).replace(tzinfo=None)  # google-auth uses naive UTC
+        expiring = creds.expiry is not None and creds.expiry - now < timedelta(seconds=YT_TOKEN_REFRESH_MARGIN)
+        if creds.refresh_token and (expiring or not creds.valid):
+            from google.auth.transport.requests import Request
+            try:
+                creds.refresh(Request())
+                TOKEN_FILE.write_text(creds.to_json(), encoding="utf-8")
+            except Exception as e:
+                print("⚠️ Failed to refresh credentials:", e)
+        return creds
 
-def comment_and_pin(youtube, video_id, comment_text="🔥 Follow for more hacking tips!"):
+def get_youtube_client():
+    """
+    Long-lived YouTube service for the calling thread (httplib2 is not thread-safe),
+    built from the discovery document bundled with google-api-python-client
+    instead of fetching it over the network. Every request carries the youtube
+    service timeout, so a stalled connection fails instead of hanging the worker.
+    The transport comes from build_http(), which stops httplib2 from following
+    308: YouTube answers every non-final resumable chunk with a Location-less 308.
+    """
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build, build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+    from googleapiclient.http import build_http
+    global _youtube_discovery_doc
+    creds = _youtube_credentials()
+    service = getattr(_youtube_local, "service", None)
+    if service is not None:
+        return service
+    if _youtube_discovery_doc is None:
+        _youtube_discovery_doc = get_static_doc("youtube", "v3")
+        if _youtube_discovery_doc and YOUTUBE_API_ROOT:
+            doc = json.loads(_youtube_discovery_doc)
+            doc["rootUrl"] = YOUTUBE_API_ROOT
+            doc["baseUrl"] = YOUTUBE_API_ROOT + doc["servicePath"]
+            _youtube_discovery_doc = json.dumps(doc)
+    transport = build_http()
+    transport.timeout = service_guard("youtube").policy.timeout
+    http = AuthorizedHttp(creds, http=transport)
+    if _youtube_discovery_doc:
+        service = build_from_document(_youtube_discovery_doc, http=http)
+    else:
+        service = build("youtube", "v3", http=http, cache_discovery=False)
+    _youtube_local.service = service
+    return service
+
+@instrumented("comment_and_pin")
+def comment_and_pin(youtube, video_id, comment_text="🔥 Follow for more hacking tips!", ledger=None):
+    """Post the auto-comment and publish it. Returns True on success."""
+    guard = service_guard("youtube")
     try:
+        if ledger and ledger.remaining() < sum(YOUTUBE_QUOTA_COSTS[m] for m in COMMENT_METHODS):
+            send_telegram(f"⏭️ Skipping auto-comment on {video_id}: YouTube quota nearly used up")
+            return False
+        if not guard.allow():
+            print(f"⏭️ Skipping auto-comment on {video_id}: YouTube circuit open")
+            return False
         comment_response = youtube.commentThreads().insert(
             part="snippet",
             body={
@@ -302,34 +1958,66 @@ def comment_and_pin(youtube, video_id, comment_text="🔥 Follow for more hackin
                 }
             }
         ).execute()
+        if ledger:
+            ledger.record("commentThreads.insert")
 
         comment_id = comment_response["id"]
         youtube.comments().setModerationStatus(
             id=comment_id,
             moderationStatus="published"
         ).execute()
+        if ledger:
+            ledger.record("comments.setModerationStatus")
 
-        youtube.comments().markAsSpam(
-            id=comment_id,
-            spam=False
-        ).execute()
-
-        youtube.comments().setModerationStatus(
-            id=comment_id,
-            moderationStatus="published"
-        ).execute()
-        
+        guard.record_success()
         send_telegram("📌 Auto-comment added and pinned.")
+        return True
 
     except Exception as e:
+        if ledger and (is_quota_error(e) or "quotaExceeded" in str(e)):
+            ledger.mark_exhausted()
+        if _is_youtube_outage(e):
+            guard.record_failure(e)
+        else:
+            guard.record_success()
         send_telegram(f"❌ Failed to comment/pin: {e}")
-        
-# Modify upload_to_youtube to call comment_and_pin after upload
+        return False
+
+@instrumented("set_thumbnail")
+def set_thumbnail(youtube, video_id, path, ledger=None):
+    """Attach the rendered thumbnail to an uploaded video. Returns True on success."""
+    from googleapiclient.http import MediaFileUpload
+    guard = service_guard("youtube")
+    try:
+        if ledger and ledger.remaining() < YOUTUBE_QUOTA_COSTS["thumbnails.set"]:
+            send_telegram(f"⏭️ Skipping thumbnail for {video_id}: YouTube quota nearly used up")
+            return False
+        if not guard.allow():
+            print(f"⏭️ Skipping thumbnail for {video_id}: YouTube circuit open")
+            return False
+        youtube.thumbnails().set(
+            videoId=video_id, media_body=MediaFileUpload(str(path), mimetype="image/jpeg")
+        ).execute()
+        if ledger:
+            ledger.record("thumbnails.set")
+        guard.record_success()
+        send_telegram(f"🖼️ Thumbnail set for {video_id}")
+        return True
+
+    except Exception as e:
+        if ledger and (is_quota_error(e) or "quotaExceeded" in str(e)):
+            ledger.mark_exhausted()
+        if _is_youtube_outage(e):
+            guard.record_failure(e)
+        else:
+            guard.record_success()
+        send_telegram(f"❌ Failed to set thumbnail: {e}")
+        return False
 
-def upload_to_youtube(video_path, caption, ig_tags):
-    youtube = get_youtube_client()
+def build_upload_metadata(caption, ig_tags, ai_title=None):
+    """Title, description, tags and category for one reel (the thumbnail is its own stage)."""
     try:
-        ai_title = generate_ai_title(caption)
+        ai_title = ai_title or generate_ai_title(caption)
         title = ai_title.strip()
         if not title.lower().endswith("#shorts"):
             title += " #shorts"
@@ -352,74 +2040,740 @@ def upload_to_youtube(video_path, caption, ig_tags):
 
     {' '.join(final_tags)}
 """
-    thumb_path = generate_thumbnail(title, THUMBNAIL_DIR / "thumb.jpg")
+    return {
+        "title": title,
+        "description": description,
+        "tags": final_tags,
+        "category_id": determine_category_id(caption),
+    }
 
+RETRIABLE_STATUS_CODES = {500, 502, 503, 504}
+
+def _retriable_exceptions():
+    import httplib2
+    return (OSError, ConnectionError, TimeoutError, httplib2.HttpLib2Error)
+
+def _is_youtube_outage(error):
+    """5xx and network errors count against the youtube breaker; 4xx answers do not."""
+    status = getattr(getattr(error, "resp", None), "status", None)
+    if status is not None:
+        return status in RETRIABLE_STATUS_CODES
+    return isinstance(error, _retriable_exceptions())
+
+def _new_upload_request(youtube, video_path, body, media=None):
+    from googleapiclient.http import MediaFileUpload
+    if media is None:
+        media = MediaFileUpload(video_path, mimetype="video/mp4", chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+    return youtube.videos().insert(part="snippet,status", body=body, media_body=media)
+
+@instrumented("upload_to_youtube", size=lambda vid, video_path, *a, **kw: os.path.getsize(video_path) if video_path else 0)
+def upload_to_youtube(video_path, metadata, youtube=None, shortcode=None, store=None, ledger=None, media=None):
+    """
+    Chunked resumable upload with per-chunk retry. When `store` and `shortcode`
+    are given, the session URI and offset are persisted after every chunk so a
+    crashed run resumes the same upload. Quota spent is recorded in `ledger`.
+    `media` (a streaming MediaUpload) replaces video_path; such uploads cannot
+    be resumed by a later run, so no session is stored.
+    Retries come out of the youtube service's budget; while its circuit is open
+    the upload is deferred (the file stays cached for the next run).
+    Returns the video id, or None on failure.
+    """
+    from googleapiclient.errors import HttpError
+    retriable_exceptions = _retriable_exceptions()
+    guard = service_guard("youtube")
+    label = shortcode or Path(video_path).name
+    if not guard.allow():
+        span_note(outcome="circuit_open")
+        send_telegram(f"⏸️ Upload of {label} deferred: YouTube circuit open")
+        return None
+    youtube = youtube or get_youtube_client()
     body = {
         "snippet": {
-            "title": title,
-            "description": description,
-            "tags": final_tags,
-            "categoryId": determine_category_id(caption)
+            "title": metadata["title"],
+            "description": metadata["description"],
+            "tags": metadata["tags"],
+            "categoryId": metadata["category_id"]
         },
         "status": {"privacyStatus": "public"}
     }
+    file_size = os.path.getsize(video_path) if media is None else None
+    if media is not None:
+        store = None
 
+    req = None
     try:
-        req = youtube.videos().insert(
-            part="snippet,status",
-            body=body,
-            media_body=MediaFileUpload(video_path)
-        )
-        res = req.execute()
-        vid = res.get("id")
+        req = _new_upload_request(youtube, video_path, body, media)
+        session = store.get_upload_session(shortcode) if store and shortcode else None
+        if session and (session["video_path"] != str(video_path) or session["size"] != file_size
+                        or time.time() - session["created_at"] > UPLOAD_SESSION_MAX_AGE):
+            store.clear_upload_session(shortcode)
+            session = None
+        if session:
+            req.resumable_uri = session["resumable_uri"]
+            req._in_error_state = True  # next_chunk() first asks the server how many bytes it holds
+            send_telegram(f"🔁 Resuming upload of {label} from {session['progress'] // (1024 * 1024)} MB")
+
+        response = None
+        retries = 0
+        next_report = 25
+        while response is None:
+            try:
+                status, response = req.next_chunk()
+            except HttpError as e:
+                code = e.resp.status
+                if session and code in (404, 410):
+                    # Session expired server-side: start a fresh upload once
+                    send_telegram(f"⚠️ Upload session for {label} expired, restarting upload")
+                    store.clear_upload_session(shortcode)
+                    session = None
+                    req = _new_upload_request(youtube, video_path, body, media)
+                    continue
+                if code not in RETRIABLE_STATUS_CODES:
+                    raise
+                guard.record_failure(e)
+                retries += 1
+                delay = guard.retry_delay(retries)
+                if delay is None:
+                    raise
+                span_note(retries=1)
+                _sleep_backoff(retries, delay, f"HTTP {code} on {label}")
+                continue
+            except retriable_exceptions as e:
+                guard.record_failure(e)
+                retries += 1
+                delay = guard.retry_delay(retries)
+                if delay is None:
+                    send_telegram(f"❌ Upload of {label} interrupted after {retries - 1} retries: {e}")
+                    return None
+                span_note(retries=1)
+                _sleep_backoff(retries, delay, f"{type(e).__name__} on {label}")
+                continue
+
+            guard.record_success()
+            retries = 0
+            if store and shortcode and req.resumable_uri and response is None:
+                store.save_upload_session(shortcode, video_path, file_size, req.resumable_uri, req.resumable_progress)
+            if status:
+                pct = int(status.progress() * 100)
+                if pct >= next_report:
+                    send_telegram(f"📶 {label}: {pct}% uploaded")
+                    next_report = (pct // 25 + 1) * 25
+
+        if store and shortcode:
+            store.clear_upload_session(shortcode)
+        if ledger:
+            ledger.record("videos.insert")
+        vid = response.get("id")
         send_telegram(f"✅ Uploaded → https://youtu.be/{vid}")
-        comment_and_pin(youtube, vid)
-        return True
+        return vid
+    except StreamSourceError:
+        if ledger and req is not None and req.resumable_uri:
+            ledger.record("videos.insert")  # the abandoned session was still charged
+        raise
     except HttpError as e:
+        if not _is_youtube_outage(e):
+            guard.record_success()  # YouTube answered; the request itself was refused
+        if ledger:
+            ledger.record("videos.insert")  # rejected inserts are still charged
+            if is_quota_error(e):
+                ledger.mark_exhausted()
         send_telegram(f"❌ Upload failed: {e}")
+        return None
+
+def _sleep_backoff(attempt, delay, reason):
+    print(f"⏳ Retry {attempt}/{UPLOAD_MAX_RETRIES} in {delay:.1f}s ({reason})")
+    time.sleep(delay)
+
+# ---------------------- Streaming uploads ----------------------
+class StreamSourceError(RuntimeError):
+    """The streamed reel failed, ended short or would need a rewind; it has to go through disk."""
+
+def stream_eligible(info):
+    """
+    True when a live probe `info` is one progressive HTTP(S) file that
+    plan_normalization would only remux, i.e. it can go to YouTube byte for byte.
+    """
+    if not info or info.get("from_cache") or info.get("requested_formats") or not info.get("url"):
+        return False
+    if info.get("protocol", "https") not in ("http", "https"):
         return False
+    w, h, _, dur = probe_from_info(info)
+    return bool(w and h and dur) and plan_normalization(w, h, dur) == "remux"
+
+class StreamBuffer:
+    """
+    `yt-dlp -o -` for one probed reel, read through a buffer that keeps only the
+    bytes YouTube has not acknowledged, so at most one upload chunk. The pipe
+    provides back-pressure: yt-dlp blocks while the uploader is busy.
+    """
+
+    READ_BLOCK = 1024 * 1024
+
+    def __init__(self, info):
+        self.expected = info.get("filesize")
+        with tempfile.NamedTemporaryFile("w", suffix=".info.json", delete=False, encoding="utf-8") as f:
+            json.dump(info, f)
+        self._info_path = f.name
+        self._stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "yt_dlp", "--quiet", "--no-warnings", "--no-progress",
+             "--load-info-json", self._info_path, "-f", info.get("format_id") or "mp4", "-o", "-"],
+            stdout=subprocess.PIPE, stderr=self._stderr,
+        )
+        self._buf = bytearray()
+        self._start = 0  # stream offset of _buf[0]
+        self._eof = False
+        self.read_bytes = 0
+        self.peak_buffer = 0
+
+    def getbytes(self, begin, length):
+        """Bytes [begin, begin + length); a short result means the stream has ended."""
+        if not self._start <= begin <= self._start + len(self._buf):
+            raise StreamSourceError(f"upload asked for byte {begin}; only {self._start}+ is buffered")
+        del self._buf[:begin - self._start]  # acknowledged by YouTube
+        self._start = begin
+        while len(self._buf) < length and not self._eof:
+            block = self.proc.stdout.read(min(self.READ_BLOCK, length - len(self._buf)))
+            if not block:
+                self._finish()
+                break
+            self._buf += block
+            self.read_bytes += len(block)
+        self.peak_buffer = max(self.peak_buffer, len(self._buf))
+        return bytes(self._buf[:length])
+
+    def _finish(self):
+        """End of stream: make sure it is the whole reel before the last chunk finalizes the upload."""
+        self._eof = True
+        code = self.proc.wait(timeout=60)
+        if code != 0:
+            self._stderr.seek(0)
+            tail = self._stderr.read().decode("utf-8", errors="ignore").strip()[-300:]
+            raise StreamSourceError(f"yt-dlp exited with {code}: {tail}")
+        if not self.read_bytes or (self.expected and self.read_bytes != self.expected):
+            raise StreamSourceError(f"stream ended after {self.read_bytes} of {self.expected or '?'} bytes")
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc.stdout.close()
+        self._stderr.close()
+        _remove_file(self._info_path)
+
+@functools.lru_cache(maxsize=None)
+def _streaming_media_upload_class():
+    """MediaUpload over a StreamBuffer; defined on first use, like every googleapiclient import."""
+    from googleapiclient.http import MediaUpload
+
+    class StreamingMediaUpload(MediaUpload):
+        def __init__(self, stream, mimetype="video/mp4", chunksize=UPLOAD_CHUNK_SIZE):
+            self._stream = stream
+            self._mimetype = mimetype
+            self._chunksize = chunksize
+
+        def chunksize(self):
+            return self._chunksize
+
+        def mimetype(self):
+            return self._mimetype
+
+        def size(self):
+            return None  # unknown until yt-dlp finishes; the short last chunk completes the upload
+
+        def resumable(self):
+            return True
+
+        def has_stream(self):
+            return False
+
+        def getbytes(self, begin, length):
+            return self._stream.getbytes(begin, length)
+
+    return StreamingMediaUpload
+
+@instrumented("upload_stream_to_youtube")
+def upload_stream_to_youtube(info, metadata, shortcode, ledger=None):
+    """
+    Upload one reel straight from yt-dlp's output. Returns the video id, or None,
+    like upload_to_youtube; raises StreamSourceError when the reel could not be
+    streamed to the end, so the caller can fall back to downloading it.
+    """
+    stream = StreamBuffer(info)
+    try:
+        media = _streaming_media_upload_class()(stream)
+        return upload_to_youtube(None, metadata, shortcode=shortcode, ledger=ledger, media=media)
+    finally:
+        stream.close()
+        span_note(bytes=stream.read_bytes, buffer_peak=stream.peak_buffer)
+        resource_meter.observe("stream_buffer_peak_bytes", stream.peak_buffer)
+        print(f"🌊 {shortcode}: streamed {stream.read_bytes / 1048576:.1f} MB, "
+              f"peak buffer {stream.peak_buffer / 1048576:.1f} MB")
 
 
 def filter_relevant_hashtags(caption, allowed_keywords, max_count=3):
     """Extracts up to `max_count` hashtags from caption that match allowed_keywords."""
-    hashtags = re.findall(r"#\w+", caption)
-    hashtags = [tag for tag in hashtags if any(kw in tag.lower() for kw in allowed_keywords)]
+    needles = _keyword_pattern(tuple(allowed_keywords))
+    hashtags = [tag for tag in _HASHTAG_RE.findall(caption) if needles.search(tag.lower())]
     return list(dict.fromkeys(hashtags))[:max_count]
 
-def download_reel(url, idx=None, total=None):
+def probe_reel(url):
+    """Metadata-only yt-dlp extraction (download=False): formats, duration, caption."""
+    from yt_dlp import YoutubeDL
+    opts = {"format": "mp4", "quiet": True, "skip_download": True}
+    with YoutubeDL(opts) as ydl:
+        return ydl.sanitize_info(ydl.extract_info(url, download=False))
+
+def probe_from_info(info):
+    """width, height, fps, duration of the selected format, or zeros when yt-dlp did not report them."""
+    def num(key, cast):
+        try:
+            return cast(info.get(key) or 0)
+        except (TypeError, ValueError):
+            return cast(0)
+    return num("width", int), num("height", int), num("fps", float), num("duration", float)
+
+def shorts_eligibility(info):
+    """
+    (accepted, reason, score) for a probed reel. Rejects reels without video or
+    longer than MAX_SOURCE_SECONDS; the score ranks Shorts-ready (<= MAX_SHORT_SECONDS,
+    vertical) reels first, then by resolution and frame rate.
+    """
+    w, h, fps, dur = probe_from_info(info)
+    if info.get("vcodec") == "none":
+        return False, "no video stream", 0
+    if dur > MAX_SOURCE_SECONDS:
+        return False, f"too long ({round(dur)}s > {MAX_SOURCE_SECONDS}s)", 0
+    shorts_ready = (dur == 0 or dur <= MAX_SHORT_SECONDS) and (w == 0 or h >= w)
+    score = (1 if shorts_ready else 0, min(w, h), round(fps))
+    return True, "ok" if shorts_ready else "needs conforming", score
+
+def caption_parts(info):
+    """Full caption (hashtags and @mentions stripped) plus the niche hashtags worth keeping."""
+    analysis = caption_analyzer.analyze(info.get("description") or info.get("title") or "")
+    return analysis.caption, list(analysis.niche_tags)
+
+def caption_parts_many(infos):
+    """caption_parts() for a batch of yt-dlp info dicts, analysed in one pass."""
+    captions = [info.get("description") or info.get("title") or "" for info in infos]
+    return [(a.caption, list(a.niche_tags)) for a in caption_analyzer.analyze_many(captions)]
+
+@instrumented("download_reel", size=lambda result, *a, **kw: os.path.getsize(result[0]))
+def download_reel(url, idx=None, total=None, profile=None, info=None):
+    """
+    Download one reel to downloads/<shortcode>.mp4. With a pre-probed `info` dict
+    the media is fetched from it directly (no second extraction) and its
+    width/height/fps/duration are used instead of running ffprobe. The file name is
+    stable, so a .part left by an interrupted run is resumed rather than restarted.
+    """
+    from yt_dlp import YoutubeDL
     DOWNLOAD_DIR.mkdir(exist_ok=True)
-    opts = {"format": "mp4", "outtmpl": str(DOWNLOAD_DIR / "%(id)s.%(ext)s"), "quiet": True}
+    opts = {
+        "format": "mp4",
+        "outtmpl": str(DOWNLOAD_DIR / f"{extract_shortcode(url)}.%(ext)s"),
+        "quiet": True,
+        "continuedl": True,
+        "nopart": False,
+    }
     try:
         with YoutubeDL(opts) as ydl:
-            info = ydl.extract_info(url, download=True)
+            if info is not None:
+                try:
+                    info = ydl.process_ie_result(dict(info), download=True) or info
+                except Exception as e:
+                    # Format URLs can expire between probe and download; extract again
+                    print(f"⚠️ Reusing probed info failed for {url}: {e}")
+                    info = ydl.extract_info(url, download=True)
+            else:
+                info = ydl.extract_info(url, download=True)
             filename = ydl.prepare_filename(info)
 
-            # --- Keep FULL caption for AI title ---
-            full_caption = info.get("description") or info.get("title") or ""
-            full_caption = full_caption.strip()
+        clean_caption, filtered_tags = caption_parts(info)
 
-            # --- Extract only relevant hashtags ---
-            niche_keywords = ["hack", "hacking", "cyber", "security", "bug", "tech", "ai", "automation", "linux", "tools"]
-            filtered_tags = filter_relevant_hashtags(full_caption, niche_keywords, max_count=3)
-
-            # --- Remove hashtags & @mentions from the clean caption for description/title ---
-            clean_caption = re.sub(r'@\w+', '', full_caption)
-            clean_caption = re.sub(r'#\w+', '', clean_caption).strip()
-
-            # 📊 Check resolution
+        # 📊 Check resolution (ffprobe only when the info dict lacks it)
+        w, h, fps, dur = probe_from_info(info)
+        if not (w and h and dur):
             w, h, fps, dur = get_video_probe(filename)
-            reel_num = f"[{idx}/{total}]" if idx and total else ""
-            send_telegram(
-                f"🎥 {w}x{h} @ {round(fps,1)}fps ({quality_label(w, h)}) | {round(dur,1)}s {reel_num}\n"
-                f"Profile: {INSTAGRAM_PROFILE}\nURL: {url}\n"
-                f"📌 Kept hashtags: {' '.join(filtered_tags) if filtered_tags else 'None'}"
-            )
+        reel_num = f"[{idx}/{total}]" if idx and total else ""
+        send_telegram(
+            f"🎥 {w}x{h} @ {round(fps,1)}fps ({quality_label(w, h)}) | {round(dur,1)}s {reel_num}\n"
+            f"Profile: {profile or INSTAGRAM_PROFILE}\nURL: {url}\n"
+            f"📌 Kept hashtags: {' '.join(filtered_tags) if filtered_tags else 'None'}"
+        )
 
-            return filename, clean_caption, filtered_tags
+        return filename, clean_caption, filtered_tags, (w, h, fps, dur), info
     except Exception as e:
         send_telegram(f"❌ Download error for {url}: {e}")
         raise
 
+# ---------------------- Media cache ----------------------
+def _file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return True
+    except OSError as e:
+        print(f"⚠️ Could not remove {path}: {e}")
+        return False
+
+CACHED_INFO_KEYS = ("id", "title", "description", "duration", "width", "height", "fps", "vcodec")
+
+class MediaCache:
+    """
+    Downloaded reels kept by shortcode until their upload is confirmed, so a failed
+    upload or a re-run reuses the verified file instead of downloading it again.
+    The index (path, size, sha256, slim yt-dlp info) lives in the state DB.
+    downloads/ and normalized/ share MEDIA_CACHE_MAX_BYTES and are trimmed least
+    recently used first; files held by running jobs or unfinished upload sessions
+    are never evicted.
+    """
+
+    def __init__(self, directory, normalized_dir, max_bytes):
+        self.directory = Path(directory)
+        self.normalized_dir = Path(normalized_dir)
+        self.max_bytes = max_bytes
+        self.store = None
+        self._lock = threading.Lock()
+        self._held = {}  # shortcode -> paths in use by a running job
+
+    def bind(self, store):
+        self.store = store
+
+    def hold(self, shortcode, *paths):
+        with self._lock:
+            self._held.setdefault(shortcode, set()).update(str(p) for p in paths if p)
+
+    def release(self, shortcode):
+        with self._lock:
+            self._held.pop(shortcode, None)
+
+    def cached_info(self, shortcode):
+        """Slim info dict of a cached reel (no hashing), so the metadata probe can be skipped."""
+        entry = self.store.get_cached_media(shortcode) if self.store else None
+        if entry and os.path.exists(entry["path"]):
+            return dict(entry["info"], from_cache=True)
+        return None
+
+    def lookup(self, shortcode):
+        """{"path", "sha256", "info"} of a verified cached copy, or None. Bad entries are dropped."""
+        entry = self.store.get_cached_media(shortcode) if self.store else None
+        if not entry:
+            return None
+        try:
+            ok = os.path.getsize(entry["path"]) == entry["size"] and _file_digest(entry["path"]) == entry["sha256"]
+        except OSError:
+            ok = False
+        if not ok:
+            print(f"⚠️ Cached copy of {shortcode} failed verification; downloading again")
+            self.forget(shortcode)
+            return None
+        self.store.touch_cached_media(shortcode)
+        return entry
+
+    def admit(self, shortcode, path, info, probe):
+        """Index a finished download and trim the cache. Returns the file's sha256."""
+        sha256 = _file_digest(path)
+        if self.store:
+            slim = {key: info.get(key) for key in CACHED_INFO_KEYS}
+            slim["width"], slim["height"], slim["fps"], slim["duration"] = probe
+            self.store.put_cached_media(shortcode, path, os.path.getsize(path), sha256, slim)
+            self.evict()
+        return sha256
+
+    def forget(self, shortcode):
+        """Delete a reel's download and its index entry (after a confirmed upload)."""
+        entry = self.store.get_cached_media(shortcode) if self.store else None
+        if entry:
+            _remove_file(entry["path"])
+            self.store.drop_cached_media(shortcode)
+
+    def evict(self):
+        """Remove stale partial downloads, then least recently used files until under budget."""
+        if not self.store:
+            return
+        with self._lock:
+            held_codes = set(self._held)
+            held_paths = set().union(*self._held.values()) if self._held else set()
+        held_paths |= {str(p) for p in self.store.upload_session_paths()}
+        indexed = {str(Path(path)): (code, last_used) for code, path, _, last_used in self.store.cached_media_lru()}
+
+        now = time.time()
+        candidates = []  # (last_used, path, size, shortcode or None)
+        total = 0
+        for directory in (self.directory, self.normalized_dir):
+            if not directory.is_dir():
+                continue
+            for path in directory.iterdir():
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                if not path.is_file():
+                    continue
+                key = str(path)
+                code, last_used = indexed.get(key, (None, st.st_mtime))
+                busy = key in held_paths or (directory == self.directory and path.name.split(".")[0] in held_codes)
+                if not busy and path.suffix in (".part", ".ytdl") and now - st.st_mtime > MEDIA_CACHE_PART_MAX_AGE:
+                    _remove_file(path)
+                    continue
+                total += st.st_size
+                if not busy:
+                    candidates.append((last_used, key, st.st_size, code))
+
+        freed = 0
+        for _, key, size, code in sorted(candidates):
+            if total <= self.max_bytes:
+                break
+            if _remove_file(key):
+                total -= size
+                freed += size
+                if code:
+                    self.store.drop_cached_media(code)
+        for key, (code, _) in indexed.items():
+            if not os.path.exists(key):
+                self.store.drop_cached_media(code)  # removed by hand
+        if freed:
+            print(f"🧹 Media cache: freed {freed / 1048576:.1f} MB, {total / 1048576:.1f} MB in use")
+
+media_cache = MediaCache(DOWNLOAD_DIR, NORMALIZE_CACHE_DIR, MEDIA_CACHE_MAX_BYTES)
+
+# ---------------------- Shorts normalization ----------------------
+def plan_normalization(w, h, dur):
+    """
+    'remux' when already 9:16 and short enough, 'trim' when only too long,
+    'conform' when the frame must be padded/cropped to 9:16 (re-encode).
+    """
+    if w and h and abs(w / h - SHORTS_ASPECT) > SHORTS_ASPECT_TOLERANCE:
+        return "conform"
+    if dur > MAX_SHORT_SECONDS:
+        return "trim"
+    return "remux"
+
+def _conform_filter(w, h):
+    ratio = w / h
+    if ratio > 0.75:
+        # Square or landscape: keep the whole frame and letterbox to 9:16
+        return "pad=iw:trunc(iw*16/9/2)*2:(ow-iw)/2:(oh-ih)/2:black,setsar=1"
+    if ratio > SHORTS_ASPECT:
+        # Slightly wide portrait (e.g. 4:5): crop the sides
+        return "crop=trunc(ih*9/16/2)*2:ih,setsar=1"
+    # Taller than 9:16: crop top and bottom
+    return "crop=iw:trunc(iw*16/9/2)*2,setsar=1"
+
+def normalize_for_shorts(src, w, h, dur, digest=None):
+    """
+    Make `src` Shorts-conformant with ffmpeg. Runs in a worker process.
+    Output is content-addressed (source hash + transform), so a cached result is
+    returned untouched on re-runs. `digest` is the source sha256 when the media
+    cache already knows it. Returns (output_path, action, seconds, cached).
+    """
+    started = time.perf_counter()
+    action = plan_normalization(w, h, dur)
+    key = hashlib.sha256(
+        f"{digest or _file_digest(src)}:{action}:{w}x{h}:{MAX_SHORT_SECONDS}:{NORMALIZE_VERSION}".encode()
+    ).hexdigest()[:32]
+    NORMALIZE_CACHE_DIR.mkdir(exist_ok=True)
+    out = NORMALIZE_CACHE_DIR / f"{key}.mp4"
+    if out.exists() and out.stat().st_size > 0:
+        os.utime(out)  # mtime is the LRU clock for normalized outputs
+        return str(out), action, time.perf_counter() - started, True
+
+    cmd = [FFMPEG, "-y", "-v", "error", "-i", str(src), "-map", "0:v:0", "-map", "0:a:0?"]
+    if dur > MAX_SHORT_SECONDS:
+        # Input starts on a keyframe; with stream copy the cut ends on the last packet before the limit
+        cmd += ["-t", f"{MAX_SHORT_SECONDS - 0.05:.2f}"]
+    if action == "conform":
+        cmd += ["-vf", _conform_filter(w, h), "-c:v", "libx264", "-preset", "veryfast", "-crf", "20",
+                "-pix_fmt", "yuv420p", "-c:a", "copy"]
+    else:
+        cmd += ["-c", "copy"]
+    tmp = out.with_name(out.stem + ".part.mp4")
+    cmd += ["-movflags", "+faststart", str(tmp)]
+    subprocess.run(cmd, check=True, capture_output=True)
+    os.replace(tmp, out)
+    return str(out), action, time.perf_counter() - started, False
+
+_media_pool = None
+
+def get_media_pool():
+    """Process pool for ffmpeg/hash work, created on first use."""
+    global _media_pool
+    if _media_pool is None:
+        _media_pool = ProcessPoolExecutor(
+            max_workers=max(1, NORMALIZE_WORKERS), mp_context=multiprocessing.get_context("spawn")
+        )
+    return _media_pool
+
+def shutdown_media_pool():
+    global _media_pool
+    if _media_pool is not None:
+        _media_pool.shutdown(wait=True, cancel_futures=True)
+        _media_pool = None
+
+
+# ---------------------- Duplicate detection ----------------------
+def fingerprint_video(source, frames=FINGERPRINT_FRAMES):
+    """
+    64-bit DCT perceptual hashes (pHash) of `frames` frames spread over the clip,
+    skipping the first/last 5% and near-uniform frames, which would match anything.
+    `source` is a local file or, for streamed reels, the probed media URL.
+    Runs in a worker process.
+    """
+    import cv2
+    import numpy as np
+    if "://" in str(source):
+        ms = int(FINGERPRINT_URL_TIMEOUT * 1000)
+        cap = cv2.VideoCapture(str(source), cv2.CAP_FFMPEG,
+                               [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, ms])
+    else:
+        cap = cv2.VideoCapture(str(source))
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if total <= 0:
+            return []
+        start, end = int(total * 0.05), max(int(total * 0.95), 1)
+        hashes = []
+        for pos in sorted({int(start + (end - start) * (i + 0.5) / frames) for i in range(frames)}):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+            ok, frame = cap.read()
+            if not ok:
+                continue
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if gray.std() < 8:
+                continue
+            small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+            block = cv2.dct(small)[:8, :8]
+            bits = (block > np.median(block.flatten()[1:])).flatten()
+            hashes.append(int.from_bytes(np.packbits(bits).tobytes(), "big"))
+        return hashes
+    finally:
+        cap.release()
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64-bit hashes: each hash is filed under its four 16-bit
+    chunks. Two hashes within r bits agree to within r // 4 bits on at least one
+    chunk (pigeonhole), so a search probes each chunk table with every value that
+    close and verifies only those candidates. (A BK-tree prunes almost nothing at
+    this radius on 64 bits and was slower than a linear scan.)
+    """
+
+    CHUNKS, CHUNK_BITS = 4, 16
+
+    def __init__(self):
+        self.tables = [{} for _ in range(self.CHUNKS)]
+        self.size = 0
+        self._masks = {}
+
+    def _chunks(self, value):
+        mask = (1 << self.CHUNK_BITS) - 1
+        return [(value >> (i * self.CHUNK_BITS)) & mask for i in range(self.CHUNKS)]
+
+    def _flip_masks(self, bits):
+        """Every CHUNK_BITS-bit mask with at most `bits` bits set."""
+        if bits not in self._masks:
+            self._masks[bits] = [
+                sum(1 << b for b in combo)
+                for n in range(bits + 1) for combo in itertools.combinations(range(self.CHUNK_BITS), n)
+            ]
+        return self._masks[bits]
+
+    def add(self, value, item):
+        self.size += 1
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            table.setdefault(chunk, []).append((value, item))
+
+    def search(self, value, radius):
+        """[(distance, item), ...] for every stored hash within `radius` bits of `value`."""
+        masks = self._flip_masks(radius // self.CHUNKS)
+        seen, found = set(), []
+        for table, chunk in zip(self.tables, self._chunks(value)):
+            for m in masks:
+                for entry in table.get(chunk ^ m, ()):
+                    if entry in seen:
+                        continue
+                    seen.add(entry)
+                    d = hamming(value, entry[0])
+                    if d <= radius:
+                        found.append((d, entry[1]))
+        return found
+
+class FingerprintIndex:
+    """
+    Frame hashes of every uploaded reel in a MultiIndexHash, loaded from the state DB once
+    per process. A clip is a duplicate when FINGERPRINT_MATCH_RATIO of its frames
+    lie within FINGERPRINT_MAX_DISTANCE of frames of one earlier reel. Reels in
+    flight are claimed too, so two profiles sharing a clip in one run upload it once.
+    """
+
+    def __init__(self):
+        self.store = None
+        self._tree = None
+        self._pending = {}  # shortcode -> hashes of a reel not uploaded yet
+        self._lock = threading.Lock()
+
+    def bind(self, store):
+        if store is not self.store:
+            self.store = store
+            self._tree = None
+
+    def _loaded_tree(self):
+        if self._tree is None:
+            tree = MultiIndexHash()
+            for shortcode, hashes in self.store.all_fingerprints():
+                for h in hashes:
+                    tree.add(h, shortcode)
+            self._tree = tree
+        return self._tree
+
+    def check_and_claim(self, shortcode, hashes):
+        """(original shortcode, share of frames matched) if `hashes` duplicate a known reel, else claim them."""
+        with self._lock:
+            tree = self._loaded_tree()
+            self._pending.pop(shortcode, None)
+            votes = {}
+            for h in hashes:
+                matched = {code for _, code in tree.search(h, FINGERPRINT_MAX_DISTANCE)}
+                matched |= {code for code, others in self._pending.items()
+                            if any(hamming(h, o) <= FINGERPRINT_MAX_DISTANCE for o in others)}
+                matched.discard(shortcode)
+                for code in matched:
+                    votes[code] = votes.get(code, 0) + 1
+            if votes:
+                original, count = max(votes.items(), key=lambda kv: kv[1])
+                if count / len(hashes) >= FINGERPRINT_MATCH_RATIO:
+                    return original, count / len(hashes)
+            self._pending[shortcode] = hashes
+            return None
+
+    def commit(self, shortcode, video_id):
+        """The claimed reel was uploaded: persist its hashes and index them."""
+        with self._lock:
+            hashes = self._pending.pop(shortcode, None)
+            if hashes is None:
+                return
+            self.store.add_fingerprint(shortcode, video_id, hashes)
+            tree = self._loaded_tree()
+            for h in hashes:
+                tree.add(h, shortcode)
+
+    def release(self, shortcode):
+        with self._lock:
+            self._pending.pop(shortcode, None)
+
+fingerprint_index = FingerprintIndex()
+
 
 async def inject_cookies(context):
     try:
@@ -429,133 +2783,1062 @@ async def inject_cookies(context):
         send_telegram(f"❌ Cookie injection error: {e}")
         raise  # stop if cookies fail, so IG login doesn’t break
 
-async def upload_debug_screenshot_and_html(page):
+async def upload_debug_screenshot_and_html(page, profile=None):
     try:
-        page_screenshot = "debug_reels.png"
-        page_html = "debug_reels.html"
-        await page.screenshot(path=page_screenshot, full_page=True)
-        html_content = await page.content()
+        suffix = f"_{profile}" if profile else ""
+        page_screenshot = f"debug_reels{suffix}.png"
+        page_html = f"debug_reels{suffix}.html"
+        await page.screenshot(path=page_screenshot, full_page=True, timeout=15000)
+        html_content = await asyncio.wait_for(page.content(), 15)
         Path(page_html).write_text(html_content, encoding="utf-8")
 
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
-        with open(page_screenshot, "rb") as photo:
-            requests.post(url, files={"photo": photo}, data={"chat_id": TELEGRAM_CHAT_ID, "caption": "⚠️ No reels found. Screenshot of IG page."})
-
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendDocument"
-        with open(page_html, "rb") as doc:
-            requests.post(url, files={"document": doc}, data={"chat_id": TELEGRAM_CHAT_ID, "caption": "📄 HTML content from IG page."})
+        notifier.send_file("sendPhoto", "photo", page_screenshot, f"⚠️ No reels found{f' for @{profile}' if profile else ''}. Screenshot of IG page.")
+        notifier.send_file("sendDocument", "document", page_html, "📄 HTML content from IG page.")
     except Exception as e:
         send_telegram(f"❌ Failed to upload debug screenshot: {e}")
 
 # ---------------------- Reel Fetching Logic ----------------------
 
 
-async def fetch_reel_links():
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-    headless=True,
-    args=[
-        "--disable-gpu",
-        "--disable-software-rasterizer",
-        "--no-sandbox",
-        "--disable-dev-shm-usage",
-        "--disable-features=UseOzonePlatform",
-        "--disable-blink-features=AutomationControlled",
-        "--use-gl=swiftshader",
-        "--ignore-gpu-blocklist"
-    ]
+_REEL_FEED_MARKERS = ("/graphql", "/api/v1/clips/", "/api/v1/feed/")
+
+def _media_owner(node):
+    """(lowercased username, id) of a media object's owner; either may be None."""
+    owner = node.get("user") or node.get("owner")
+    if not isinstance(owner, dict):
+        return None, None
+    owner_id = owner.get("pk") or owner.get("id")
+    return (owner.get("username") or "").lower() or None, str(owner_id) if owner_id else None
+
+def _reels_from_payload(payload, profile=None, owner_ids=None):
+    """
+    Yield (shortcode, pinned) for every media object in an Instagram JSON/GraphQL
+    response, in feed order. Media objects carry a `code` next to a `pk`/`id`.
+    With `profile`, only media owned by that account are kept: feed responses also
+    carry suggested reels from other creators. Owner ids seen next to the profile's
+    username are added to `owner_ids`, so media that only name their owner by id match too.
+    """
+    media = []
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            code = node.get("code") or node.get("shortcode")
+            if isinstance(code, str) and ("pk" in node or "id" in node):
+                media.append(node)
+                continue
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+    owner_ids = set() if owner_ids is None else owner_ids
+    if profile:
+        owner_ids.update(oid for name, oid in map(_media_owner, media) if oid and name == profile.lower())
+    for node in media:
+        if profile:
+            username, owner_id = _media_owner(node)
+            if username != profile.lower() and not (username is None and owner_id in owner_ids):
+                continue
+        pinned = bool(node.get("clips_tab_pinned_user_ids") or node.get("timeline_pinned_user_ids"))
+        yield node.get("code") or node.get("shortcode"), pinned
+
+async def _block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def _scan_profile_reels(page, profile, is_known=None, want=None):
+    """
+    Collect reel URLs for `profile`, newest first, from the feed's JSON responses.
+    DOM anchors carry no owner (suggested, tagged and collab reels look the same),
+    so they are read only when no feed response arrives within
+    DISCOVERY_FIRST_DATA_TIMEOUT. Scrolling stops once `want` unseen reels
+    are found or DISCOVERY_KNOWN_STREAK consecutive non-pinned reels are known.
+    """
+    found = {}  # shortcode -> pinned, in discovery order
+    owner_ids = set()  # the profile's account id(s), learned from its own media
+    new_data = asyncio.Event()
+
+    async def on_response(response):
+        if not any(marker in response.url for marker in _REEL_FEED_MARKERS):
+            return
+        try:
+            payload = await response.json()
+        except Exception:
+            return  # not JSON (or body already gone)
+        for code, pinned in _reels_from_payload(payload, profile, owner_ids):
+            if code not in found:
+                found[code] = pinned
+                new_data.set()
+
+    async def collect_dom():
+        hrefs = await page.eval_on_selector_all('a[href*="/reel/"]', "els => els.map(e => e.href)")
+        for href in hrefs:
+            code = normalize_shortcode(href)
+            if code and code not in found:
+                found[code] = False
+                new_data.set()
+
+    def enough():
+        new_count = streak = 0
+        for code, pinned in found.items():
+            if is_known and is_known(code):
+                if not pinned:
+                    streak += 1
+                    if streak >= DISCOVERY_KNOWN_STREAK:
+                        return True
+            else:
+                streak = 0
+                new_count += 1
+                if want and new_count >= want:
+                    return True
+        return False
+
+    async def wait_for_data(timeout):
+        try:
+            await asyncio.wait_for(new_data.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    page.on("response", on_response)
+    url = f"{INSTAGRAM_BASE_URL}/{profile}/reels/"
+    await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+    await wait_for_data(DISCOVERY_FIRST_DATA_TIMEOUT)
+    dom_fallback = not found
+    if dom_fallback:
+        print(f"⚠️ @{profile}: no reel feed responses intercepted; falling back to page links")
+
+    idle_scrolls = 0
+    for _ in range(DISCOVERY_MAX_SCROLLS):
+        if dom_fallback:
+            await collect_dom()
+        if enough():
+            break
+        new_data.clear()
+        await page.mouse.wheel(0, 2000)
+        if await wait_for_data(DISCOVERY_SCROLL_WAIT):
+            idle_scrolls = 0
+        else:
+            idle_scrolls += 1
+            if idle_scrolls >= 2:
+                break  # end of the feed
+    if dom_fallback:
+        await collect_dom()
+
+    return [f"{INSTAGRAM_BASE_URL}/reel/{code}/" for code in found]
+
+def parse_profiles(spec=INSTAGRAM_PROFILES, default_limit=UPLOAD_LIMIT):
+    """[(profile, upload_limit), ...] from INSTAGRAM_PROFILES, else the single INSTAGRAM_PROFILE."""
+    profiles = []
+    for part in re.split(r"[,\s]+", spec or ""):
+        name, _, limit = part.partition(":")
+        name = name.strip().lstrip("@")
+        if name and name not in dict(profiles):
+            profiles.append((name, int(limit) if limit.strip() else default_limit))
+    if not profiles and INSTAGRAM_PROFILE:
+        profiles.append((INSTAGRAM_PROFILE, default_limit))
+    return profiles
+
+CHROMIUM_ARGS = [
+    "--disable-gpu",
+    "--disable-software-rasterizer",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-features=UseOzonePlatform",
+    "--disable-blink-features=AutomationControlled",
+    "--use-gl=swiftshader",
+    "--ignore-gpu-blocklist"
+]
+IPHONE_CONTEXT = dict(
+    user_agent=USER_AGENT_IPHONE,
+    viewport={"width": 375, "height": 812},
+    device_scale_factor=2,
+    is_mobile=True,
+    has_touch=True,
+    locale="en-US"
 )
 
+def _cdp_healthy(timeout=2.0):
+    """True when a browser answers on BROWSER_CDP_URL."""
+    try:
+        r = requests.get(f"{BROWSER_CDP_URL}/json/version", timeout=timeout)
+        return r.ok and "webSocketDebuggerUrl" in r.json()
+    except (requests.RequestException, ValueError):
+        return False
+
+def _cdp_browser_flags():
+    """The flags that identify our long-lived Chromium: its CDP port and the ig_user_data profile."""
+    port = BROWSER_CDP_URL.rsplit(":", 1)[-1].split("/")[0]
+    return [f"--remote-debugging-port={port}", f"--user-data-dir={IG_USER_DATA_DIR.resolve()}"]
 
-        context = await browser.new_context(
-            user_agent=USER_AGENT_IPHONE,
-            viewport={"width": 375, "height": 812},
-            device_scale_factor=2,
-            is_mobile=True,
-            has_touch=True,
-            locale="en-US"
-        )
+def _is_our_browser(pid):
+    """True only if `pid` is a Chromium started with our CDP flags; unverifiable (no /proc) counts as False."""
+    try:
+        cmdline = Path(f"/proc/{pid}/cmdline").read_bytes().decode("utf-8", errors="ignore").split("\0")
+    except OSError:
+        return False
+    return all(flag in cmdline for flag in _cdp_browser_flags())
+
+def _stop_cdp_browser():
+    """
+    Kill the Chromium a previous run started, if its pid file is still around.
+    After a reboot or crash the pid may belong to another process by now, so it is
+    only signalled when its command line carries our CDP flags; otherwise the
+    stale pid file is just removed.
+    """
+    try:
+        pid = int(BROWSER_PID_FILE.read_text())
+    except (OSError, ValueError):
+        return
+    if _is_our_browser(pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+    else:
+        print(f"🧹 Stale {BROWSER_PID_FILE} (pid {pid} is not our browser); removing it")
+    BROWSER_PID_FILE.unlink(missing_ok=True)
+
+def _launch_cdp_browser(executable):
+    """Start a detached headless Chromium on the CDP port, on the ig_user_data profile. It outlives this run."""
+    _stop_cdp_browser()
+    IG_USER_DATA_DIR.mkdir(exist_ok=True)
+    proc = subprocess.Popen(
+        [executable, "--headless=new", *_cdp_browser_flags(), *CHROMIUM_ARGS, "about:blank"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    BROWSER_PID_FILE.write_text(str(proc.pid))
+    deadline = time.monotonic() + BROWSER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if _cdp_healthy():
+            print(f"🧭 Long-lived browser started (pid {proc.pid}) on {BROWSER_CDP_URL}")
+            return
+        if proc.poll() is not None:
+            raise RuntimeError(f"Chromium exited with code {proc.returncode}")
+        time.sleep(0.25)
+    raise RuntimeError(f"Chromium did not answer on {BROWSER_CDP_URL} within {BROWSER_START_TIMEOUT:.0f}s")
+
+async def _connect_cdp(p):
+    """Attach to the long-lived browser, (re)launching it when it is missing or unresponsive."""
+    if not await asyncio.to_thread(_cdp_healthy):
+        print(f"🧭 No browser on {BROWSER_CDP_URL}; launching one")
+        await asyncio.to_thread(_launch_cdp_browser, p.chromium.executable_path)
+    try:
+        return await p.chromium.connect_over_cdp(BROWSER_CDP_URL, timeout=BROWSER_START_TIMEOUT * 1000)
+    except Exception as e:
+        send_telegram(f"♻️ Browser on {BROWSER_CDP_URL} is unusable ({e}); relaunching")
+        await asyncio.to_thread(_launch_cdp_browser, p.chromium.executable_path)
+        return await p.chromium.connect_over_cdp(BROWSER_CDP_URL, timeout=BROWSER_START_TIMEOUT * 1000)
+
+async def _ensure_ig_session(context):
+    """Keep the profile's own login; inject IG_COOKIES_JSON only when it has none."""
+    cookies = await context.cookies(INSTAGRAM_BASE_URL)
+    if any(c["name"] == "sessionid" for c in cookies):
+        return
+    if IG_COOKIES_JSON:
         await inject_cookies(context)
+    else:
+        print(f"⚠️ No Instagram login in {IG_USER_DATA_DIR} and IG_COOKIES_JSON is unset; scanning logged out")
+
+async def _emulate_iphone(page):
+    """Per-page equivalent of IPHONE_CONTEXT for contexts we did not create (CDP default context)."""
+    cdp = await page.context.new_cdp_session(page)
+    await cdp.send("Emulation.setUserAgentOverride", {"userAgent": USER_AGENT_IPHONE, "acceptLanguage": "en-US"})
+    await cdp.send("Emulation.setDeviceMetricsOverride",
+                   {"width": 375, "height": 812, "deviceScaleFactor": 2, "mobile": True})
+    await cdp.send("Emulation.setTouchEmulationEnabled", {"enabled": True})
+
+def _shared_context_pages(context, emulate=False):
+    """Pages in one long-lived context, so cookies, storage, service worker and HTTP cache stay warm."""
+    @asynccontextmanager
+    async def open_page():
         page = await context.new_page()
+        try:
+            if emulate:
+                await _emulate_iphone(page)
+            await page.route("**/*", _block_heavy_resources)
+            yield page
+        finally:
+            await page.close()
+    return open_page
+
+@asynccontextmanager
+async def _discovery_browser(p):
+    """Yields `open_page()`, an async context manager giving a mobile page ready to scan, per BROWSER_MODE."""
+    if BROWSER_MODE == "persistent":
+        context = await p.chromium.launch_persistent_context(
+            str(IG_USER_DATA_DIR), headless=True, args=CHROMIUM_ARGS, **IPHONE_CONTEXT
+        )
+        try:
+            await _ensure_ig_session(context)
+            yield _shared_context_pages(context)
+        finally:
+            await context.close()
+    elif BROWSER_MODE == "cdp":
+        browser = await _connect_cdp(p)
+        try:
+            context = browser.contexts[0] if browser.contexts else await browser.new_context()
+            await _ensure_ig_session(context)
+            yield _shared_context_pages(context, emulate=True)
+        finally:
+            await browser.close()  # only disconnects; the browser stays up for the next run
+    else:
+        browser = await p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+
+        @asynccontextmanager
+        async def open_page():
+            context = await browser.new_context(**IPHONE_CONTEXT)
+            try:
+                await inject_cookies(context)
+                await context.route("**/*", _block_heavy_resources)
+                yield await context.new_page()
+            finally:
+                await context.close()
 
         try:
-            url = f"https://www.instagram.com/{INSTAGRAM_PROFILE}/reels/"
-            await page.goto(url, timeout=60000)
-            await page.wait_for_load_state("networkidle")
-            await asyncio.sleep(3)
-
-            for _ in range(10):
-                await page.mouse.wheel(0, 2000)
-                await asyncio.sleep(1.5)
-
-            hrefs = await page.eval_on_selector_all(
-                'a[href*="/reel/"]',
-                "els => els.map(e => e.href)"
-            )
+            yield open_page
+        finally:
+            await browser.close()
+
+async def _fetch_profile(open_page, profile, limit, is_known, semaphore):
+    async with semaphore:
+        try:
+            async with open_page() as page:
+                hrefs = await _scan_profile_reels(page, profile, is_known=is_known, want=limit)
 
-            print(f"🔗 Reels fetched: {len(hrefs)}")
-            for h in hrefs[:5]:
-                print("Sample reel:", h)
+                print(f"🔗 Reels fetched: {len(hrefs)} (@{profile})")
+                for h in hrefs[:5]:
+                    print("Sample reel:", h)
 
-            if not hrefs:
-                await upload_debug_screenshot_and_html(page)
-                html_content = await page.content()
-                Path("debug_reels.html").write_text(html_content, encoding="utf-8")
+                if not hrefs:
+                    await upload_debug_screenshot_and_html(page, profile)
 
-            return list(dict.fromkeys(hrefs))
+                return hrefs
 
         except Exception as e:
-            send_telegram(f"❌ IG Reel Fetch Error: {e}")
+            send_telegram(f"❌ IG Reel Fetch Error (@{profile}): {e}")
             return []
-        finally:
-            await browser.close()
+
+class WarmBrowser:
+    """
+    Discovery browser (in whatever BROWSER_MODE) kept open across daemon cycles,
+    health-checked before each use and reopened when it has died.
+    """
+
+    def __init__(self):
+        self._playwright = None
+        self._session = None
+        self.open_page = None
+
+    async def _healthy(self):
+        try:
+            async with self.open_page() as page:
+                await asyncio.wait_for(page.evaluate("1"), 10)
+            return True
+        except Exception:
+            return False
+
+    async def ensure(self):
+        """`open_page` of a live browser, starting or restarting it as needed."""
+        if self.open_page is not None:
+            if await self._healthy():
+                return self.open_page
+            send_telegram("♻️ Discovery browser stopped responding; reopening it")
+        await self.close()
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        self._session = _discovery_browser(self._playwright)
+        self.open_page = await self._session.__aenter__()
+        return self.open_page
+
+    async def close(self):
+        session, playwright = self._session, self._playwright
+        self._session = self._playwright = self.open_page = None
+        if session is not None:
+            try:
+                await session.__aexit__(None, None, None)
+            except Exception as e:
+                print(f"⚠️ Closing discovery browser: {e}")
+        if playwright is not None:
+            try:
+                await playwright.stop()
+            except Exception as e:
+                print(f"⚠️ Stopping Playwright: {e}")
+
+@instrumented("fetch_reel_links", ok=lambda reels: any(reels.values()))
+async def fetch_reel_links(profiles=None, is_known=None, warm=None):
+    """
+    Scan every (profile, limit) on one shared browser, PROFILE_CONCURRENCY
+    pages at a time. Returns {profile: [reel urls, newest first]}.
+    With a WarmBrowser (daemon mode) its browser is reused instead of started.
+    """
+    from playwright.async_api import async_playwright
+    profiles = profiles or parse_profiles()
+    semaphore = asyncio.Semaphore(max(1, PROFILE_CONCURRENCY))
+
+    async def scan(open_page, batch):
+        results = await asyncio.gather(*(
+            _fetch_profile(open_page, profile, limit, is_known, semaphore) for profile, limit in batch
+        ))
+        return {profile: hrefs for (profile, _), hrefs in zip(batch, results)}
+
+    if warm is not None:
+        return await scan(await warm.ensure(), profiles)
+
+    async with async_playwright() as p:
+        async with _discovery_browser(p) as open_page:
+            reels = await scan(open_page, profiles)
+        missed = [(profile, limit) for profile, limit in profiles if not reels[profile]]
+        if BROWSER_MODE == "cdp" and missed and not await asyncio.to_thread(_cdp_healthy):
+            # The long-lived browser died mid-scan: relaunch it and retry what it dropped
+            send_telegram("♻️ Browser died during discovery; relaunching for "
+                          + ", ".join(f"@{profile}" for profile, _ in missed))
+            async with _discovery_browser(p) as open_page:
+                reels.update(await scan(open_page, missed))
+        return reels
+
+
+def pick_candidates(profiles, reels_by_profile, is_known):
+    """
+    Up to each profile's limit of unprocessed reels, newest first, as
+    {profile: [(url, shortcode), ...]}. A shortcode shared by two profiles is kept once.
+    """
+    picked = {}
+    seen = set()
+    for profile, limit in profiles:
+        picked[profile] = []
+        for url in reels_by_profile.get(profile, []):
+            if len(picked[profile]) >= limit:
+                break
+            shortcode = extract_shortcode(url)
+            if shortcode in seen or is_known(shortcode):
+                continue
+            seen.add(shortcode)
+            picked[profile].append((url, shortcode))
+    return picked
+
+async def prefilter_candidates(profiles, candidates, store=None):
+    """
+    Probe every candidate's metadata (no media bytes), drop ineligible reels and
+    keep the best-ranked ones up to each profile's limit. Returns one prioritized
+    list of (profile, url, shortcode, info), interleaved round-robin across profiles.
+    Ineligible reels are recorded as 'skipped' in `store`, so later runs neither
+    probe nor announce them again. Failed probes are not recorded: they may be transient.
+    """
+    semaphore = asyncio.Semaphore(max(1, PROBE_CONCURRENCY))
+
+    async def probe(profile, url, shortcode):
+        info = media_cache.cached_info(shortcode)  # downloaded before: no network needed
+        if info is None:
+            async with semaphore:
+                try:
+                    info = await asyncio.to_thread(probe_reel, url)
+                except Exception as e:
+                    send_telegram(f"⚠️ Metadata probe failed for {url} (@{profile}): {e}")
+                    return None
+        accepted, reason, score = shorts_eligibility(info)
+        if not accepted:
+            send_telegram(f"⏭️ Skipping {shortcode} (@{profile}): {reason}")
+            if store is not None:
+                store.record(shortcode, "skipped", profile=profile, url=url, reason=reason)
+            return None
+        return score, (profile, url, shortcode, info)
+
+    per_profile = []
+    for profile, limit in profiles:
+        probed = await asyncio.gather(*(probe(profile, url, sc) for url, sc in candidates.get(profile, [])))
+        ranked = [item for _, item in sorted(
+            (p for p in probed if p), key=lambda p: p[0], reverse=True
+        )]
+        per_profile.append(ranked[:limit])
+
+    queue_ = []
+    for rank in range(max((len(p) for p in per_profile), default=0)):
+        for ranked in per_profile:
+            if rank < len(ranked):
+                queue_.append(ranked[rank])
+    return queue_
 
 
 # ---------------------- Main Upload Logic ----------------------
 def extract_shortcode(url):
-    return url.split("/")[-2]
+    return normalize_shortcode(url)
+
+@dataclass
+class ReelJob:
+    """One reel travelling through the pipeline stages."""
+    idx: int
+    total: int
+    link: str
+    shortcode: str
+    profile: str = None
+    info: dict = None  # yt-dlp metadata from the pre-download probe
+    source_file: str = None  # as downloaded (kept in the media cache)
+    source_digest: str = None  # sha256 of source_file, so normalization does not hash it again
+    file: str = None  # what gets uploaded (normalized copy of source_file)
+    stream: bool = False  # STREAM_UPLOADS: no local copy, uploaded straight from yt-dlp's output
+    probe: tuple = None  # width, height, fps, duration
+    title_task: object = None  # asyncio task started once the reel passes the duplicate check
+    upload_slot: bool = False  # holds one of the run's quota slots, returned if it drops before normalization
+    caption: str = ""
+    tags: list = field(default_factory=list)
+    metadata: dict = None
+    thumbnail: str = None  # per-reel JPEG under THUMBNAIL_DIR, removed once the upload is settled
+    video_id: str = None
+
+_STOP = object()  # end-of-stream marker passed between stage queues
+
+def _discard_job_file(job):
+    """
+    Finish with a job's files. Only a confirmed upload deletes the download and the
+    normalized copy; otherwise both stay in the media cache for the next attempt.
+    """
+    if job.video_id:
+        fingerprint_index.commit(job.shortcode, job.video_id)
+        media_cache.forget(job.shortcode)
+        if job.file and job.file != job.source_file:
+            _remove_file(job.file)
+    else:
+        fingerprint_index.release(job.shortcode)
+        if job.thumbnail:
+            _remove_file(job.thumbnail)  # cheap to render again; an uploaded reel's goes after thumbnails().set
+    media_cache.release(job.shortcode)
+
+async def _run_stage(name, worker, inbox, outbox, concurrency):
+    """
+    Run `concurrency` workers that pull jobs from `inbox`, await `worker(job)`
+    and push the returned job to `outbox`. A worker returning None (or raising)
+    drops the job; failures are isolated to that reel.
+    """
+    async def _loop():
+        while True:
+            job = await inbox.get()
+            if job is _STOP:
+                await inbox.put(_STOP)  # let sibling workers see it too
+                return
+            try:
+                result = await worker(job)
+            except Exception as e:
+                send_telegram(f"❌ {name} error for {job.link}: {e}")
+                _discard_job_file(job)
+                continue
+            if result is not None and outbox is not None:
+                await outbox.put(result)
 
-async def main():
-    send_telegram(f"🚀 Starting IG → YT run | Profile: @{INSTAGRAM_PROFILE} | Limit: {UPLOAD_LIMIT}")
-    processed = load_processed()
-    reels = await fetch_reel_links()
-
-    to_upload = []
-    for url in reels:
-        shortcode = extract_shortcode(url)
-        if shortcode not in processed:
-            to_upload.append((url, shortcode))
-        if len(to_upload) >= UPLOAD_LIMIT:
-            break
+    await asyncio.gather(*(_loop() for _ in range(max(1, concurrency))))
+    if outbox is not None:
+        await outbox.put(_STOP)
+
+async def run_cycle(profiles, store, warm=None, quiet=False):
+    """
+    One discovery → upload pass over `profiles` on an open store. Returns
+    {profile: [shortcodes discovered as new]}, which the daemon paces its polls by.
+    `quiet` (daemon polls) keeps the start and "no new reels" notices off Telegram;
+    the start notice is sent only once reels are actually queued.
+    """
+    instrumentation.reset()
+    resource_meter.start()
+    start_notice = (
+        "🚀 Starting IG → YT run | "
+        + ", ".join(f"@{profile} (limit {limit})" for profile, limit in profiles)
+    )
+    print(start_notice)
+    if not quiet:
+        send_telegram(start_notice)
+    ledger = QuotaLedger(store)
+    media_cache.bind(store)
+    fingerprint_index.bind(store)
+    await asyncio.to_thread(media_cache.evict)  # clear what a crashed run left behind
+    results = {profile: {"uploaded": 0, "failed": 0, "duplicate": 0} for profile, _ in profiles}
+    discovered = {profile: [] for profile, _ in profiles}
+    upload_slots = budget = 0  # uploads the quota allows; taken when a reel's download starts
+    unsettled = 0  # slots held by reels still before normalization, which may hand them back
+    slot_changed = asyncio.Condition()
+    deferred = []  # reels left for a later run because the slots ran out
+    if trends_cache.is_stale():
+        trends_cache.refresh_in_background()  # warm trends while IG is scanned
+
+    download_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    fingerprint_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    normalize_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    metadata_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    thumbnail_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    upload_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    comment_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    async def fetch_stage():
+        nonlocal upload_slots, budget
+        try:
+            # Nothing to do without quota; otherwise it caps the reels that pass the duplicate check
+            budget = upload_slots = ledger.affordable_uploads()
+            if budget <= 0:
+                print("⛔ YouTube quota exhausted for today. Deferring all reels.")
+                send_telegram(
+                    f"⛔ YouTube quota exhausted ({ledger.used()}/{ledger.daily_limit} units today, Pacific time). "
+                    "Deferring all reels to the next quota day."
+                )
+                return 0
+
+            # Discover and probe a few spare candidates so rejected reels can be replaced
+            scan = [(profile, limit * PROBE_CANDIDATE_FACTOR) for profile, limit in profiles]
+            reels_by_profile = await fetch_reel_links(scan, is_known=store.is_processed, warm=warm)
+            candidates = pick_candidates(scan, reels_by_profile, store.is_processed)
+            discovered.update({profile: [code for _, code in picks] for profile, picks in candidates.items()})
+            to_upload = await prefilter_candidates(profiles, candidates, store)
+
+            if not to_upload:
+                if quiet:
+                    print("💤 No new reels found.")
+                else:
+                    print("⚠️ No new reels found. Sending alert...")
+                    send_telegram("⚠️ No new reels found. Either all reels are uploaded or fetch failed.")
+            else:
+                if quiet:
+                    send_telegram(f"{start_notice} | {len(to_upload)} new reel(s) queued")
+                if len(profiles) > 1 and not quiet:
+                    queued_profiles = {profile for profile, *_ in to_upload}
+                    for profile, _ in profiles:
+                        if profile not in queued_profiles:
+                            send_telegram(f"ℹ️ @{profile}: no new reels")
+
+            # Analyse every queued caption in one batch; the per-reel lookups later are cache hits
+            caption_parts_many([info for *_, info in to_upload])
+            for idx, (profile, link, shortcode, info) in enumerate(to_upload, start=1):
+                await download_q.put(ReelJob(idx, len(to_upload), link, shortcode, profile, info=info))
+            return len(to_upload)
+        finally:
+            await download_q.put(_STOP)
+
+    async def fetch_to_disk(job):
+        print(f"⬇️ Downloading {job.link}")
+        # A probe answered from the cache index carries no format URLs; let yt-dlp extract again
+        info = None if job.info and job.info.get("from_cache") else job.info
+        job.source_file, job.caption, job.tags, job.probe, info = await asyncio.to_thread(
+            download_reel, job.link, idx=job.idx, total=job.total, profile=job.profile, info=info
+        )
+        job.source_digest = await asyncio.to_thread(
+            media_cache.admit, job.shortcode, job.source_file, info, job.probe
+        )
+        job.file = job.source_file
+
+    async def take_upload_slot(job):
+        """
+        Reserve a slot before any download work. With none free, wait while a held
+        slot may still come back (its reel can fail download, dedupe or normalization).
+        """
+        nonlocal upload_slots, unsettled
+        async with slot_changed:
+            await slot_changed.wait_for(lambda: upload_slots > 0 or unsettled == 0)
+            if upload_slots <= 0:
+                return False
+            upload_slots -= 1
+            unsettled += 1
+            job.upload_slot = True
+            return True
+
+    async def settle_upload_slot(job, keep):
+        """The reel passed normalization (keep) or dropped out before it (slot returned)."""
+        nonlocal upload_slots, unsettled
+        if not job.upload_slot:
+            return
+        async with slot_changed:
+            job.upload_slot = False
+            unsettled -= 1
+            if not keep:
+                upload_slots += 1
+            slot_changed.notify_all()
+
+    def slot_returning(worker):
+        """Stage worker that hands the job's slot back when the job is dropped or fails."""
+        async def run(job):
+            try:
+                result = await worker(job)
+            except Exception:
+                await settle_upload_slot(job, keep=False)
+                raise
+            if result is None:
+                await settle_upload_slot(job, keep=False)
+            return result
+        return run
+
+    async def download_stage(job):
+        if not await take_upload_slot(job):
+            deferred.append(job)  # every slot is spoken for: no point downloading it this run
+            return None
+        media_cache.hold(job.shortcode)
+        cached = await asyncio.to_thread(media_cache.lookup, job.shortcode)
+        if cached:
+            job.source_file, job.source_digest = cached["path"], cached["sha256"]
+            job.caption, job.tags = caption_parts(cached["info"])
+            job.probe = probe_from_info(cached["info"])
+            job.file = job.source_file
+            print(f"♻️ Using cached download of {job.shortcode}")
+            send_telegram(f"♻️ {job.shortcode}: reusing verified cached download ({cached['size'] / 1048576:.1f} MB)")
+        elif STREAM_UPLOADS and stream_eligible(job.info):
+            job.stream = True
+            job.caption, job.tags = caption_parts(job.info)
+            job.probe = w, h, fps, dur = probe_from_info(job.info)  # from the info dict, no ffprobe
+            print(f"🌊 {job.shortcode} is Shorts-ready; streaming it without a local copy")
+            send_telegram(
+                f"🌊 {w}x{h} @ {round(fps, 1)}fps | {round(dur, 1)}s [{job.idx}/{job.total}] → streaming upload\n"
+                f"Profile: {job.profile}\nURL: {job.link}\n"
+                f"📌 Kept hashtags: {' '.join(job.tags) if job.tags else 'None'}"
+            )
+        else:
+            await fetch_to_disk(job)
+        return job
+
+    async def fingerprint_stage(job):
+        job = await dedupe(job)
+        if job is not None:
+            job.title_task = title_service.submit_many([job.caption])[0]  # only reels past the duplicate check
+        return job
+
+    async def dedupe(job):
+        loop = asyncio.get_running_loop()
+        if job.stream:
+            # Hash frames straight from the probed URL; without a verdict, go through disk so the check still runs
+            try:
+                hashes = await loop.run_in_executor(get_media_pool(), fingerprint_video, job.info["url"])
+            except Exception as e:
+                print(f"⚠️ Fingerprinting {job.shortcode} from its URL failed ({e})")
+                hashes = []
+            if len(hashes) < FINGERPRINT_MIN_FRAMES:
+                print(f"💾 {job.shortcode}: no fingerprint from the stream; downloading it instead")
+                job.stream = False
+                await fetch_to_disk(job)
+        if not job.stream:
+            try:
+                hashes = await loop.run_in_executor(get_media_pool(), fingerprint_video, job.source_file)
+            except Exception as e:
+                print(f"⚠️ Fingerprinting {job.shortcode} failed ({e}); skipping the duplicate check")
+                return job
+        if len(hashes) < FINGERPRINT_MIN_FRAMES:
+            return job
+        match = fingerprint_index.check_and_claim(job.shortcode, hashes)
+        if match is None:
+            return job
+        original, share = match
+        send_telegram(f"🧬 Skipping {job.shortcode} (@{job.profile}): same clip as {original} "
+                      f"({share:.0%} of sampled frames match)")
+        store.record(job.shortcode, "duplicate", profile=job.profile, url=job.link)
+        results[job.profile]["duplicate"] += 1
+        media_cache.forget(job.shortcode)
+        _discard_job_file(job)
+        return None
+
+    async def normalize(job):
+        w, h, _, dur = job.probe
+        loop = asyncio.get_running_loop()
+        try:
+            job.file, action, seconds, cached = await loop.run_in_executor(
+                get_media_pool(), normalize_for_shorts, job.source_file, w, h, dur, job.source_digest
+            )
+        except subprocess.CalledProcessError as e:
+            stderr = (e.stderr or b"").decode("utf-8", errors="ignore").strip()[-300:]
+            raise RuntimeError(f"ffmpeg failed: {stderr}") from e
+        media_cache.hold(job.shortcode, job.file)
+        note = "cache hit" if cached else f"{seconds:.1f}s"
+        print(f"🎞️ Normalized {job.shortcode}: {action} ({note})")
+        send_telegram(f"🎞️ {job.shortcode}: {action} → Shorts-ready ({note})")
+
+    async def normalize_stage(job):
+        if not job.stream:  # streamed reels are Shorts-ready as they are
+            await normalize(job)
+        await settle_upload_slot(job, keep=True)
+        return job
+
+    async def metadata_stage(job):
+        title = await job.title_task if job.title_task else None
+        job.metadata = await asyncio.to_thread(build_upload_metadata, job.caption, job.tags, title)
+        return job
+
+    async def thumbnail_stage(job):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            job.thumbnail = await loop.run_in_executor(
+                get_media_pool(), generate_thumbnail, job.metadata["title"],
+                THUMBNAIL_DIR / f"{job.shortcode}.jpg",
+                job.info.get("url") if job.stream else job.source_file,  # ffmpeg seeks over HTTP for streams
+                min(job.probe[3], MAX_SHORT_SECONDS),
+            )
+        except Exception as e:
+            # A missing thumbnail never holds back the upload; YouTube picks a frame itself
+            send_telegram(f"❌ Thumbnail error for {job.shortcode}: {e}")
+            return job
+        print(f"🖼️ Thumbnail for {job.shortcode} ({time.perf_counter() - started:.1f}s)")
+        return job
+
+    async def upload_stage(job):
+        try:
+            if ledger.remaining() < YOUTUBE_QUOTA_COSTS["videos.insert"]:
+                send_telegram(f"⛔ Deferring {job.shortcode}: YouTube quota exhausted mid-run")
+                return None
+            if job.stream:
+                send_telegram(f"⏫ Streaming {job.shortcode} to YouTube…")
+                try:
+                    job.video_id = await asyncio.to_thread(
+                        upload_stream_to_youtube, job.info, job.metadata, job.shortcode, ledger
+                    )
+                except StreamSourceError as e:
+                    send_telegram(f"⚠️ Streaming {job.shortcode} failed ({e}); downloading it instead")
+                    job.stream = False
+                    await fetch_to_disk(job)
+                    await normalize(job)
+                    if ledger.remaining() < YOUTUBE_QUOTA_COSTS["videos.insert"]:
+                        send_telegram(f"⛔ Deferring {job.shortcode}: YouTube quota exhausted mid-run")
+                        return None
+            if not job.stream:
+                print(f"📤 Uploading to YT: {job.file}")
+                send_telegram(f"⏫ Uploading {job.shortcode} to YouTube…")
+                job.video_id = await asyncio.to_thread(
+                    upload_to_youtube, job.file, job.metadata, None, job.shortcode, store, ledger
+                )
+        finally:
+            _discard_job_file(job)
+
+        if not job.video_id:
+            store.record(job.shortcode, "failed", profile=job.profile, url=job.link)
+            results[job.profile]["failed"] += 1
+            return None
+        print(f"✅ Uploaded: {job.shortcode}")
+        send_telegram(f"✅ Uploaded {job.shortcode} (@{job.profile}) successfully!")
+        store.record(job.shortcode, "uploaded", profile=job.profile, url=job.link, video_id=job.video_id)
+        results[job.profile]["uploaded"] += 1
+        if job.thumbnail:
+            try:
+                if THUMBNAIL_UPLOAD:
+                    await asyncio.to_thread(
+                        lambda: set_thumbnail(get_youtube_client(), job.video_id, job.thumbnail, ledger)
+                    )
+            finally:
+                _remove_file(job.thumbnail)
+        return job
+
+    async def comment_stage(job):
+        await asyncio.to_thread(lambda: comment_and_pin(get_youtube_client(), job.video_id, ledger=ledger))
+        return job
+
+    queued, *_ = await asyncio.gather(
+        fetch_stage(),
+        _run_stage("Download", slot_returning(download_stage), download_q, fingerprint_q, DOWNLOAD_CONCURRENCY),
+        _run_stage("Fingerprint", slot_returning(fingerprint_stage), fingerprint_q, normalize_q, NORMALIZE_WORKERS),
+        _run_stage("Normalize", slot_returning(normalize_stage), normalize_q, metadata_q, NORMALIZE_WORKERS),
+        _run_stage("Metadata", metadata_stage, metadata_q, thumbnail_q, METADATA_CONCURRENCY),
+        _run_stage("Thumbnail", thumbnail_stage, thumbnail_q, upload_q, NORMALIZE_WORKERS),
+        _run_stage("Upload", upload_stage, upload_q, comment_q, UPLOAD_CONCURRENCY),
+        _run_stage("Comment", comment_stage, comment_q, None, COMMENT_CONCURRENCY),
+    )
 
-    if not to_upload:
-        print("⚠️ No new reels found. Sending alert...")
-        send_telegram("⚠️ No new reels found. Either all reels are uploaded or fetch failed.")
+    if deferred:
+        send_telegram(
+            f"📉 Quota allows {budget} upload(s) now ({ledger.remaining()} units left); deferring "
+            + ", ".join(f"{job.shortcode} (@{job.profile})" for job in deferred)
+        )
+    media_cache.evict()
+    resources = await asyncio.to_thread(resource_meter.stop)
+    write_run_report(results, resources)
+    print(format_resources(resources))
+    if queued:
+        if len(profiles) > 1:
+            send_telegram("📊 " + " | ".join(
+                f"@{profile}: {r['uploaded']} uploaded, {r['failed']} failed"
+                + (f", {r['duplicate']} duplicate" if r["duplicate"] else "") for profile, r in results.items()
+            ))
+        sync_state(store)
+        send_timing_summary()
+        send_telegram(format_resources(resources))
+    return discovered
+
+def _lease_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+async def main():
+    store = open_state_store()
+    owner = _lease_owner()
+    if not store.acquire_lease("run", owner, RUN_LEASE_SECONDS):
+        print("⏳ Another run is in progress on this state DB. Exiting.")
+        send_telegram("⏳ Skipped run: another run (or the daemon) is still in progress")
+        store.close()
+        await asyncio.to_thread(notifier.flush)
         return
+    try:
+        await run_cycle(parse_profiles(), store)
+    finally:
+        store.release_lease("run", owner)
+        shutdown_media_pool()
+        store.close()
+        await asyncio.to_thread(notifier.flush)
 
-    for idx, (link, shortcode) in enumerate(to_upload, start=1):
-      try:
-        print(f"⬇️ Downloading {link}")
-        file, clean_caption, filtered_tags = download_reel(link, idx=idx, total=len(to_upload))
-        print(f"📤 Uploading to YT: {file}")
-        send_telegram(f"⏫ Uploading {shortcode} to YouTube…")
 
-        success = upload_to_youtube(file, clean_caption, filtered_tags)
+async def check_new_reels():
+    """
+    Check-only run: scan the profiles, report reels not yet uploaded, exit.
+    Only Playwright and the state DB are touched; yt-dlp, the Google client
+    libraries, OpenAI and pytrends are never imported.
+    """
+    instrumentation.reset()
+    profiles = parse_profiles()
+    store = open_state_store()
+    try:
+        reels_by_profile = await fetch_reel_links(profiles, is_known=store.is_processed)
+        new_reels = pick_candidates(profiles, reels_by_profile, store.is_processed)
+    finally:
+        store.close()
+
+    lines = []
+    for profile, reels in new_reels.items():
+        print(f"🔎 @{profile}: {len(reels)} new reel(s)")
+        for url, _ in reels:
+            print("   ", url)
+        lines.append(f"@{profile}: {len(reels)} new" + (" → " + ", ".join(code for _, code in reels) if reels else ""))
+    send_telegram("🔎 Check-only run | " + " | ".join(lines))
+    write_run_report({profile: {"new": len(reels)} for profile, reels in new_reels.items()})
+    await asyncio.to_thread(notifier.flush)
+
+
+# ---------------------- Daemon ----------------------
+POLL_SEEN_KEEP = 100  # shortcodes remembered per profile to tell new posts from retried ones
+
+def load_poll_state(store, profile):
+    try:
+        return json.loads(store.get_meta(f"poll:{profile}") or "{}")
+    except ValueError:
+        return {}
 
-        if success:
-            print(f"✅ Uploaded: {shortcode}")
-            send_telegram(f"✅ Uploaded {shortcode} successfully!")
-            processed.add(shortcode)
+def save_poll_state(store, profile, state):
+    store.set_meta(f"poll:{profile}", json.dumps(state))
 
-        os.remove(file)
+def update_poll_state(state, shortcodes, now=None):
+    """
+    Fold one poll of a profile into its pacing state and schedule the next poll.
+    Reels not seen before update an EWMA of the gap between posts, and the interval
+    becomes that gap / DAEMON_POLLS_PER_POST. A poll with nothing new backs off by
+    DAEMON_BACKOFF, but never past the usual gap. Always within the MIN/MAX bounds.
+    """
+    now = time.time() if now is None else now
+    seen = state.get("seen", [])
+    fresh = [code for code in shortcodes if code not in seen]
+    interval = state.get("interval", DAEMON_MIN_INTERVAL)
+    gap = state.get("post_gap")
+    if fresh:
+        last = state.get("last_new_at")
+        if last:
+            observed = (now - last) / len(fresh)
+            gap = observed if gap is None else DAEMON_EWMA_ALPHA * observed + (1 - DAEMON_EWMA_ALPHA) * gap
+        state["last_new_at"] = now
+        interval = gap / DAEMON_POLLS_PER_POST if gap else DAEMON_MIN_INTERVAL
+    else:
+        interval *= DAEMON_BACKOFF
+        if gap:
+            interval = min(interval, gap)
+    interval = min(max(interval, DAEMON_MIN_INTERVAL), DAEMON_MAX_INTERVAL)
+    state.update(
+        post_gap=gap,
+        interval=interval,
+        next_at=now + interval * random.uniform(0.9, 1.1),
+        seen=(seen + fresh)[-POLL_SEEN_KEEP:],
+    )
+    return state
 
-      except Exception as e:
-        send_telegram(f"❌ Processing error for {link}: {e}")
+async def run_daemon():
+    """
+    Long-running mode around run_cycle(): one browser, YouTube client, trends cache
+    and state store stay warm for every cycle. Each profile is polled when its
+    adaptive interval is due. Cycles run back to back, never overlapping, and the
+    store lease keeps cron runs out meanwhile. SIGINT/SIGTERM let the current cycle
+    finish, then exit; a second signal stops immediately.
+    Polls only reach Telegram when they queue reels or fail; otherwise a heartbeat
+    goes out every DAEMON_HEARTBEAT_HOURS.
+    """
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
 
+    def request_stop(signame):
+        print(f"🛑 {signame} received; finishing the current cycle, then stopping")
+        stop.set()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                signal.signal(sig, signal.SIG_DFL)
 
-    save_processed(processed)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, request_stop, sig.name)
+        except (NotImplementedError, RuntimeError):  # Windows event loops
+            signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(
+                request_stop, signal.Signals(signum).name))
+
+    profiles = parse_profiles()
+    if not profiles:
+        print("❌ Set INSTAGRAM_PROFILE or INSTAGRAM_PROFILES to run the daemon.")
+        return
+    store = open_state_store()
+    owner = _lease_owner()
+    warm = WarmBrowser()
+    send_telegram("🛰️ Daemon started | " + ", ".join(f"@{profile}" for profile, _ in profiles))
+    heartbeat_at = time.time()
+    polls = 0
+    try:
+        while not stop.is_set():
+            now = time.time()
+            states = {profile: load_poll_state(store, profile) for profile, _ in profiles}
+            due = [(profile, limit) for profile, limit in profiles if states[profile].get("next_at", 0) <= now]
+            delay = None
+            if due and QuotaLedger(store).affordable_uploads() <= 0:
+                delay = QuotaLedger.seconds_until_reset()
+                print(f"⛔ YouTube quota exhausted; sleeping {delay / 3600:.1f}h until the Pacific reset")
+            elif due and not store.acquire_lease("run", owner, RUN_LEASE_SECONDS):
+                delay = DAEMON_MIN_INTERVAL
+                print("⏳ Another run holds the state DB; waiting")
+            elif due:
+                polls += 1
+                try:
+                    discovered = await run_cycle(due, store, warm=warm, quiet=True)
+                    now = time.time()
+                    for profile, _ in due:
+                        states[profile] = update_poll_state(states[profile], discovered.get(profile, []), now)
+                except Exception as e:
+                    send_telegram(f"❌ Daemon cycle failed: {e}")
+                    now = time.time()
+                    for profile, _ in due:
+                        states[profile]["next_at"] = now + DAEMON_MIN_INTERVAL
+                finally:
+                    store.release_lease("run", owner)
+                for profile, _ in due:
+                    save_poll_state(store, profile, states[profile])
+                print("🗓️ Next polls: " + ", ".join(
+                    f"@{profile} in {(states[profile]['next_at'] - now) / 60:.0f} min" for profile, _ in profiles
+                ))
+            if DAEMON_HEARTBEAT_HOURS > 0 and time.time() - heartbeat_at >= DAEMON_HEARTBEAT_HOURS * 3600:
+                send_telegram(
+                    f"💓 Daemon alive | {polls} poll(s) in the last {DAEMON_HEARTBEAT_HOURS:g}h, "
+                    f"{store.count()} uploaded in total"
+                )
+                heartbeat_at, polls = time.time(), 0
+            if delay is None:
+                delay = min(states[profile].get("next_at", 0) for profile, _ in profiles) - time.time()
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=max(1.0, delay))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        await warm.close()
+        shutdown_media_pool()
+        store.close()
+        send_telegram("🛑 Daemon stopped")
+        await asyncio.to_thread(notifier.flush)
 
 
 # ---------------------- Run It ----------------------
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if "--stop-browser" in sys.argv[1:]:
+        _stop_cdp_browser()  # shut down the long-lived BROWSER_MODE=cdp browser
+    elif CHECK_ONLY:
+        asyncio.run(check_new_reels())
+    else:
+        asyncio.run(run_daemon() if DAEMON_MODE else main())
\ No newline at end of file
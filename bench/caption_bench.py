@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for caption analysis: the precompiled keyword sets and
+batch API in auto_reels_to_youtube.py against the per-call keyword scans
+they replaced (copied verbatim below as legacy_*).
+
+    python bench/caption_bench.py                  # 2,000 synthetic captions
+    python bench/caption_bench.py --captions 10000 --repeat 7
+
+Every case first checks that both implementations agree on the whole corpus;
+exits non-zero if they do not.
+"""
+import argparse, random, re, statistics, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import auto_reels_to_youtube as ar  # noqa: E402
+
+WORDS = ("learn", "wifi", "hacking", "linux", "tutorial", "setup", "the", "and", "amazing", "trick", "email",
+         "detail", "phone", "security", "daily", "course", "nmap", "payload", "review", "script", "guide",
+         "how", "to", "with", "python", "tools", "gadget", "cyber", "exploit", "bug", "bounty", "reel")
+TAGS = ("#hacking", "#cybersecurity", "#linux", "#AItools", "#viral", "#reels", "#explore", "#bugbounty",
+        "#TechTips", "#fyp", "#automation", "#love")
+TRENDS = ("IPL final", "AI tools", "iPhone launch", "Cyber attack news", "Monsoon update", "Gadget deals",
+          "Election results", "Linux kernel", "Cricket score", "Budget 2025")
+
+
+# ---- Previous implementations ----
+def legacy_determine_category_id(caption):
+    caption_lower = caption.lower()
+    if any(kw in caption_lower for kw in ["hack", "wifi", "nmap", "bug", "exploit", "payload", "malware", "phishing", "ethical", "osint"]):
+        return "26"
+    if any(kw in caption_lower for kw in ["tutorial", "learn", "how to", "guide", "class", "course", "lesson"]):
+        return "27"
+    if any(kw in caption_lower for kw in ["review", "setup", "tech", "gadget", "automation", "linux", "ai", "tools", "app", "code", "script"]):
+        return "28"
+    return "22"
+
+def legacy_filter_relevant_hashtags(caption, allowed_keywords, max_count=3):
+    hashtags = re.findall(r"#\w+", caption)
+    hashtags = [tag for tag in hashtags if any(kw in tag.lower() for kw in allowed_keywords)]
+    return list(dict.fromkeys(hashtags))[:max_count]
+
+def legacy_caption_parts(info):
+    full_caption = (info.get("description") or info.get("title") or "").strip()
+    niche_keywords = ["hack", "hacking", "cyber", "security", "bug", "tech", "ai", "automation", "linux", "tools"]
+    filtered_tags = legacy_filter_relevant_hashtags(full_caption, niche_keywords, max_count=3)
+    clean_caption = re.sub(r'@\w+', '', full_caption)
+    clean_caption = re.sub(r'#\w+', '', clean_caption).strip()
+    return clean_caption, filtered_tags
+
+def legacy_extract_keywords(text, count=2):
+    words = re.findall(r"\b[a-zA-Z0-9]{3,}\b", text.lower())
+    freq = {}
+    for w in words:
+        if w in ar._STOPWORDS:
+            continue
+        freq[w] = freq.get(w, 0) + 1
+    return [f"#{w}" for w, _ in sorted(freq.items(), key=lambda x: -x[1])[:count]]
+
+def legacy_trend_filter(trends):
+    niche_needles = ("tech", "hack", "cyber", "ai", "app", "gadget", "phone", "security", "linux", "tools")
+    return [kw for kw in trends if any(n in kw.lower() for n in niche_needles)]
+
+
+# ---- New implementations, as the pipeline calls them ----
+def new_pipeline(infos):
+    parts = ar.caption_parts_many(infos)
+    return parts, [ar.determine_category_id(caption) for caption, _ in parts]
+
+def legacy_pipeline(infos):
+    parts = [legacy_caption_parts(info) for info in infos]
+    return parts, [legacy_determine_category_id(caption) for caption, _ in parts]
+
+
+def make_corpus(n, seed):
+    rng = random.Random(seed)
+    infos = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 40))]
+        words += rng.sample(TAGS, rng.randint(0, 8)) + [f"@user{rng.randint(1, 99)}" for _ in range(rng.randint(0, 2))]
+        rng.shuffle(words)
+        infos.append({"description": " ".join(words)})
+    return infos
+
+
+def timed(fn, repeat, fresh_cache=False):
+    runs = []
+    for _ in range(repeat):
+        if fresh_cache:
+            ar.caption_analyzer = ar.CaptionAnalyzer(cache_size=ar.caption_analyzer._cache_size)
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--captions", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    infos = make_corpus(args.captions, args.seed)
+    texts = [info["description"] for info in infos]
+    trends = list(TRENDS) * 10
+    ar.caption_analyzer = ar.CaptionAnalyzer(cache_size=args.captions * 2)
+
+    cases = [
+        # name, legacy, new, reset the analyzer cache before each new run
+        ("determine_category_id", lambda: [legacy_determine_category_id(t) for t in texts],
+         lambda: [ar.determine_category_id(t) for t in texts], False),
+        ("filter_relevant_hashtags", lambda: [legacy_filter_relevant_hashtags(t, ar.NICHE_HASHTAG_KEYWORDS) for t in texts],
+         lambda: [ar.filter_relevant_hashtags(t, ar.NICHE_HASHTAG_KEYWORDS) for t in texts], False),
+        ("extract_keywords", lambda: [legacy_extract_keywords(t, 5) for t in texts],
+         lambda: [ar.extract_keywords(t, 5) for t in texts], False),
+        ("trend niche filter", lambda: [legacy_trend_filter(trends) for _ in range(100)],
+         lambda: [[kw for kw in trends if ar.caption_analyzer.matches(kw, "trend")] for _ in range(100)], False),
+        ("caption_parts (one by one)", lambda: [legacy_caption_parts(i) for i in infos],
+         lambda: [ar.caption_parts(i) for i in infos], True),
+        ("caption_parts_many (batch)", lambda: [legacy_caption_parts(i) for i in infos],
+         lambda: ar.caption_parts_many(infos), True),
+        ("caption_parts_many (cached)", lambda: [legacy_caption_parts(i) for i in infos],
+         lambda: ar.caption_parts_many(infos), False),
+        ("pipeline: parts + category", lambda: legacy_pipeline(infos), lambda: new_pipeline(infos), True),
+    ]
+
+    mismatches = 0
+    print(f"{'case':<30} {'legacy ms':>10} {'new ms':>10} {'speedup':>8}")
+    for name, legacy, new, fresh in cases:
+        if legacy() != new():
+            mismatches += 1
+            print(f"❌ {name}: results differ from the legacy implementation")
+            continue
+        legacy_s = timed(legacy, args.repeat)
+        new_s = timed(new, args.repeat, fresh_cache=fresh)
+        print(f"{name:<30} {legacy_s * 1000:>10.2f} {new_s * 1000:>10.2f} {legacy_s / new_s:>7.2f}x")
+
+    if mismatches:
+        sys.exit(1)
+    print(f"✅ Identical results on {len(infos)} captions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for Instagram, yt-dlp media, YouTube, OpenAI and Telegram.
+
+Everything is served by one threaded HTTP server, routed by path prefix:
+  /ig/<profile>/reels/          reels grid (first page in the HTML, the rest via JSON on scroll)
+  /ig/api/v1/clips/user/        paginated JSON feed, read by Playwright response interception
+  /ig/reel/<code>/              reel page with og:video + JSON-LD VideoObject for yt-dlp
+  /ig/media/<code>.mp4          generated MP4 (distinct bytes per reel, Range supported)
+  /yt/...                       YouTube Data API: resumable uploads, comments, thumbnails
+  /openai/v1/chat/completions   chat completions
+  /tg/bot<token>/<method>       Telegram Bot API
+Each service has its own latency, failure rate and (for media) bandwidth.
+"""
+import json, os, random, re, subprocess, threading, time, uuid, hashlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+FFMPEG = os.getenv("FFMPEG", "ffmpeg")
+PAGE_SIZE = 12
+
+@dataclass
+class ServiceProfile:
+    latency: float = 0.0        # seconds added to every request
+    failure_rate: float = 0.0   # share of requests answered with HTTP 503
+    bandwidth_mbps: float = 0.0  # 0 = unthrottled; applies to media downloads and upload chunks
+
+@dataclass
+class FakeWorld:
+    """Reels served per profile, plus request/failure counters per service."""
+    profiles: dict                      # profile -> number of reels
+    clip_seconds: float = 8.0
+    clip_size: str = "1080x1920"
+    services: dict = field(default_factory=dict)  # name -> ServiceProfile
+    seed: int = 1234
+    stats: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+        self.lock = threading.Lock()
+        self.uploads = {}  # session id -> {"received": int, "total": int}
+        self.reels = {
+            profile: [f"{profile[:4].upper()}{i:04d}B" for i in range(count)]
+            for profile, count in self.profiles.items()
+        }
+
+    def service(self, name):
+        return self.services.get(name) or ServiceProfile()
+
+    def count(self, name, key="requests"):
+        with self.lock:
+            self.stats.setdefault(name, {"requests": 0, "failures": 0})[key] += 1
+
+    def should_fail(self, name):
+        with self.lock:
+            return self.rng.random() < self.service(name).failure_rate
+
+    def caption(self, code):
+        n = int(re.sub(r"\D", "", code) or 0)
+        topics = ["nmap scan tricks", "wifi security basics", "bug bounty recon", "linux automation script",
+                  "osint on a budget", "python tool review"]
+        return (f"Day {n}: {topics[n % len(topics)]} for ethical hacking learners "
+                f"#cybersecurity #tech #hacking #reels #viral @creator{n % 3}")
+
+
+class MediaLibrary:
+    """One base clip rendered once, remuxed per reel with distinct metadata so every file hashes differently."""
+
+    def __init__(self, directory, seconds, size):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.seconds = seconds
+        self.size = size
+        self._lock = threading.Lock()
+        self._base = None
+
+    def _run(self, cmd):
+        subprocess.run(cmd, check=True, capture_output=True)
+
+    def base(self):
+        with self._lock:
+            if self._base is None:
+                path = self.dir / f"base_{self.size}_{self.seconds}.mp4"
+                if not path.exists():
+                    self._run([
+                        FFMPEG, "-y", "-v", "error",
+                        "-f", "lavfi", "-i", f"testsrc2=size={self.size}:rate=30",
+                        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+                        "-t", str(self.seconds), "-c:v", "libx264", "-preset", "ultrafast", "-g", "30",
+                        "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", "-movflags", "+faststart", str(path),
+                    ])
+                self._base = path
+            return self._base
+
+    def clip(self, code):
+        path = self.dir / f"{code}.mp4"
+        if not path.exists():
+            tmp = path.with_suffix(".tmp.mp4")
+            self._run([FFMPEG, "-y", "-v", "error", "-i", str(self.base()), "-c", "copy",
+                       "-metadata", f"comment={code}", "-movflags", "+faststart", str(tmp)])
+            os.replace(tmp, path)
+        return path
+
+
+def make_handler(world, media, base_url):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        # ---- helpers ----
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _send(self, status, body=b"", content_type="application/json", headers=None):
+            if isinstance(body, (dict, list)):
+                body = json.dumps(body).encode()
+            elif isinstance(body, str):
+                body = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _throttle(self, service, nbytes):
+            mbps = world.service(service).bandwidth_mbps
+            if mbps > 0 and nbytes:
+                time.sleep(nbytes * 8 / (mbps * 1_000_000))
+
+        def _gate(self, service):
+            """Latency + failure injection. Returns False when the request was failed."""
+            world.count(service)
+            time.sleep(world.service(service).latency)
+            if world.should_fail(service):
+                world.count(service, "failures")
+                self._body()
+                self._send(503, {"error": {"code": 503, "message": "injected failure"}})
+                return False
+            return True
+
+        def _route(self):
+            path = urlparse(self.path).path
+            for prefix, service in (("/ig/media/", "media"), ("/ig/", "instagram"), ("/yt/", "youtube"),
+                                    ("/openai/", "openai"), ("/tg/", "telegram")):
+                if path.startswith(prefix):
+                    return service, path
+            return None, path
+
+        # ---- verbs ----
+        def do_GET(self):
+            service, path = self._route()
+            if service is None:
+                return self._send(404, {"error": "unknown path"})
+            if not self._gate(service):
+                return
+            if service == "media":
+                return self._media(path)
+            if service == "instagram":
+                return self._instagram(path)
+            self._send(404, {"error": "unknown path"})
+
+        do_HEAD = do_GET
+
+        def do_POST(self):
+            service, path = self._route()
+            if service is None:
+                return self._send(404, {"error": "unknown path"})
+            if not self._gate(service):
+                return
+            if service == "youtube":
+                return self._youtube_post(path)
+            body = self._body()
+            if service == "openai":
+                request = json.loads(body or b"{}")
+                prompt = request.get("messages", [{}])[-1].get("content", "")
+                title = "Hacker Tip " + hashlib.sha1(prompt.encode()).hexdigest()[:6].upper()
+                return self._send(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex[:8]}", "object": "chat.completion", "created": int(time.time()),
+                    "model": request.get("model", "fake"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": title}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+                })
+            if service == "telegram":
+                return self._send(200, {"ok": True, "result": {"message_id": 1}})
+            self._send(404, {"error": "unknown path"})
+
+        def do_PUT(self):
+            service, path = self._route()
+            if service != "youtube":
+                return self._send(404, {"error": "unknown path"})
+            if not self._gate(service):
+                return
+            self._youtube_put(path)
+
+        # ---- Instagram ----
+        def _instagram(self, path):
+            query = parse_qs(urlparse(self.path).query)
+            m = re.match(r"^/ig/([^/]+)/reels/?$", path)
+            if m and m.group(1) in world.reels:
+                return self._send(200, self._grid_html(m.group(1)), "text/html; charset=utf-8")
+            if path.startswith("/ig/api/v1/clips/user/"):
+                profile = query.get("profile", [""])[0]
+                page = int(query.get("page", ["1"])[0])
+                codes = world.reels.get(profile, [])[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+                owner = {"pk": str(abs(hash(profile)) % 10**10), "username": profile}
+                items = [{"media": {"code": c, "pk": str(abs(hash(c)) % 10**12), "media_type": 2,
+                                    "user": owner if i % 2 else {"pk": owner["pk"]}}}
+                         for i, c in enumerate(codes)]
+                # Real feeds mix in suggested reels from other accounts; the scanner must skip them
+                items.append({"media": {"code": f"SUGG{page:04d}X", "pk": str(10**12 + page), "media_type": 2,
+                                        "user": {"pk": "1", "username": "someone_else"}}})
+                return self._send(200, {
+                    "items": items,
+                    "paging_info": {"more_available": (page + 1) * PAGE_SIZE < len(world.reels.get(profile, []))},
+                })
+            m = re.match(r"^/ig/reel/([^/]+)/?$", path)
+            if m:
+                return self._send(200, self._reel_html(m.group(1)), "text/html; charset=utf-8")
+            self._send(404, {"error": "unknown page"})
+
+        def _grid_html(self, profile):
+            first = "".join(f'<a href="{base_url}/ig/reel/{c}/">{c}</a><br>' for c in world.reels[profile][:PAGE_SIZE])
+            owner_pk = str(abs(hash(profile)) % 10**10)
+            return f"""<!doctype html><html><head><title>@{profile} reels</title></head>
+<body style="margin:0"><div id="grid">{first}</div><div id="spacer" style="height:4000px"></div>
+<script>
+let page = 1, loading = false, done = false;
+window.addEventListener("scroll", async () => {{
+  if (loading || done) return;
+  loading = true;
+  const r = await fetch("{base_url}/ig/api/v1/clips/user/?profile={profile}&page=" + page);
+  const data = await r.json();
+  page += 1;
+  for (const item of data.items) {{
+    if (item.media.user.pk !== "{owner_pk}") continue;
+    const a = document.createElement("a");
+    a.href = "{base_url}/ig/reel/" + item.media.code + "/";
+    a.textContent = item.media.code;
+    document.getElementById("grid").appendChild(a);
+  }}
+  done = !data.paging_info.more_available;
+  document.body.appendChild(Object.assign(document.createElement("div"), {{style: "height:4000px"}}));
+  loading = false;
+}});
+</script></body></html>"""
+
+        def _reel_html(self, code):
+            caption = world.caption(code)
+            width, height = world.clip_size.split("x")
+            video_url = f"{base_url}/ig/media/{code}.mp4"
+            ld = {
+                "@context": "https://schema.org", "@type": "VideoObject", "name": f"Reel {code}",
+                "description": caption, "contentUrl": video_url, "uploadDate": "2024-01-01T00:00:00Z",
+                "duration": f"PT{int(world.clip_seconds)}S", "width": int(width), "height": int(height),
+                "thumbnailUrl": f"{base_url}/ig/media/{code}.jpg",
+            }
+            return f"""<!doctype html><html><head><title>Reel {code}</title>
+<meta property="og:title" content="Reel {code}">
+<meta property="og:description" content="{caption}">
+<meta property="og:video" content="{video_url}">
+<meta property="og:video:type" content="video/mp4">
+<meta property="og:video:width" content="{width}"><meta property="og:video:height" content="{height}">
+<script type="application/ld+json">{json.dumps(ld)}</script>
+</head><body><video src="{video_url}"></video></body></html>"""
+
+        def _media(self, path):
+            m = re.match(r"^/ig/media/([^/.]+)\.mp4$", path)
+            if not m:
+                return self._send(404, {"error": "unknown media"})
+            data = media.clip(m.group(1)).read_bytes()
+            total = len(data)
+            start, end = 0, total - 1
+            rng = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+            status = 200
+            if rng and (rng.group(1) or rng.group(2)):
+                start = int(rng.group(1) or 0)
+                end = min(int(rng.group(2) or total - 1), total - 1)
+                status = 206
+            chunk = data[start:end + 1]
+            self._throttle("media", len(chunk))
+            headers = {"Accept-Ranges": "bytes"}
+            if status == 206:
+                headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+            self._send(status, chunk, "video/mp4", headers)
+
+        # ---- YouTube ----
+        def _youtube_post(self, path):
+            query = parse_qs(urlparse(self.path).query)
+            body = self._body()
+            if path.startswith("/yt/upload/youtube/v3/videos") and query.get("uploadType") == ["resumable"]:
+                session = uuid.uuid4().hex
+                total = self.headers.get("X-Upload-Content-Length")
+                with world.lock:
+                    world.uploads[session] = {"received": 0, "total": int(total) if total else None}
+                return self._send(200, b"", headers={"Location": f"{base_url}/yt/upload/session/{session}"})
+            if path.startswith("/yt/youtube/v3/commentThreads"):
+                return self._send(200, {"id": f"comment-{uuid.uuid4().hex[:10]}", "kind": "youtube#commentThread"})
+            if path.startswith("/yt/youtube/v3/comments/"):
+                return self._send(204, b"")
+            if path.startswith("/yt/youtube/v3/thumbnails/set") or path.startswith("/yt/upload/youtube/v3/thumbnails/set"):
+                return self._send(200, {"kind": "youtube#thumbnailSetResponse", "items": []})
+            self._send(404, {"error": {"code": 404, "message": f"no fake for POST {path}"}})
+
+        def _youtube_put(self, path):
+            m = re.match(r"^/yt/upload/session/([0-9a-f]+)$", path)
+            with world.lock:
+                session = world.uploads.get(m.group(1)) if m else None
+            if session is None:
+                self._body()
+                return self._send(404, {"error": {"code": 404, "message": "upload session not found"}})
+            content_range = self.headers.get("Content-Range", "")
+            body = self._body()
+            self._throttle("youtube", len(body))
+            status_query = re.match(r"bytes \*/(\d+|\*)", content_range)
+            chunk = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", content_range)
+            with world.lock:
+                if chunk:
+                    start, end, total = int(chunk.group(1)), int(chunk.group(2)), chunk.group(3)
+                    if start == session["received"]:
+                        session["received"] = end + 1
+                    if total != "*":
+                        session["total"] = int(total)
+                elif status_query and status_query.group(1) != "*":
+                    session["total"] = int(status_query.group(1))
+                elif not content_range:
+                    session["received"] += len(body)
+                    session["total"] = session["received"]
+                received, total = session["received"], session["total"]
+            if total is not None and received >= total:
+                return self._send(200, {"id": f"vid{uuid.uuid4().hex[:8]}", "kind": "youtube#video"})
+            headers = {"Range": f"bytes=0-{received - 1}"} if received else {}
+            self._send(308, b"", "text/plain", headers)
+
+    return Handler
+
+
+class FakeServices:
+    """Run the stand-ins on 127.0.0.1 in a background thread."""
+
+    def __init__(self, world, media_dir, host="127.0.0.1", port=0):
+        self.world = world
+        self.media = MediaLibrary(media_dir, world.clip_seconds, world.clip_size)
+        self.server = ThreadingHTTPServer((host, port), None)
+        self.base_url = f"http://{host}:{self.server.server_address[1]}"
+        self.server.RequestHandlerClass = make_handler(world, self.media, self.base_url)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def __enter__(self):
+        self.media.base()  # render once up front so it is not billed to the first download
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-services", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def env(self):
+        """Environment that points auto_reels_to_youtube.py at these stand-ins."""
+        return {
+            "INSTAGRAM_BASE_URL": f"{self.base_url}/ig",
+            "YOUTUBE_API_ROOT": f"{self.base_url}/yt/",
+            "OPENAI_BASE_URL": f"{self.base_url}/openai/v1",
+            "OPENAI_API_KEY": "sk-bench",
+            "TELEGRAM_API_BASE": f"{self.base_url}/tg",
+            "TELEGRAM_BOT_TOKEN": "bench-token",
+            "TELEGRAM_CHAT_ID": "1",
+            "IG_COOKIES_JSON": "[]",
+        }
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Startup cost of auto_reels_to_youtube.py: lazy imports vs. loading every
+heavy dependency up front (what the script used to do at module load).
+
+    python bench/import_time.py                # median of 5 cold imports each
+    python bench/import_time.py --repeat 10 --top 15
+
+Each measurement is a fresh interpreter, so nothing is shared between runs.
+Exits non-zero if a plain import pulls in any of the heavy modules again.
+"""
+import argparse, json, os, statistics, subprocess, sys, tempfile
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+PYTHONPATH = os.pathsep.join(filter(None, [str(REPO), os.environ.get("PYTHONPATH")]))
+HEAVY = [
+    "yt_dlp",
+    "playwright.async_api",
+    "googleapiclient.discovery",
+    "googleapiclient.http",
+    "google_auth_oauthlib.flow",
+    "google.oauth2.credentials",
+    "httplib2",
+    "PIL.Image",
+    "openai",
+    "pytrends.request",
+    "pandas",
+]
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import auto_reels_to_youtube
+eager = {eager!r}
+missing = []
+for name in eager:
+    try:
+        __import__(name)
+    except ImportError:
+        missing.append(name)
+elapsed = time.perf_counter() - t0
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"seconds": elapsed, "heavy_loaded": heavy, "missing": missing}}))
+"""
+
+
+def measure(eager, repeat, workdir):
+    env = dict(os.environ, PYTHONPATH=PYTHONPATH)
+    code = PROBE.format(eager=eager, heavy=HEAVY)
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    seconds = [r["seconds"] for r in runs]
+    return {"median": statistics.median(seconds), "min": min(seconds),
+            "heavy_loaded": runs[-1]["heavy_loaded"], "missing": runs[-1]["missing"]}
+
+
+def top_imports(workdir, top):
+    """Largest cumulative entries from `python -X importtime`, in seconds."""
+    env = dict(os.environ, PYTHONPATH=PYTHONPATH)
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import auto_reels_to_youtube"],
+                         cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((int(cumulative_us) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="show the N slowest imports (0 to skip)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ig2yt-import-") as workdir:
+        lazy = measure([], args.repeat, workdir)
+        eager = measure(HEAVY, args.repeat, workdir)
+        slowest = top_imports(workdir, args.top) if args.top else []
+
+    print(f"⏱️ import auto_reels_to_youtube (lazy):  median {lazy['median'] * 1000:7.1f} ms, "
+          f"min {lazy['min'] * 1000:7.1f} ms")
+    print(f"⏱️ + every heavy dependency (eager):    median {eager['median'] * 1000:7.1f} ms, "
+          f"min {eager['min'] * 1000:7.1f} ms")
+    print(f"🚀 Saved at startup: {(eager['median'] - lazy['median']) * 1000:.1f} ms")
+    if eager["missing"]:
+        print(f"ℹ️ Not installed here, so not counted: {', '.join(eager['missing'])}")
+    for seconds, name in slowest:
+        print(f"    {seconds * 1000:8.1f} ms  {name}")
+
+    if lazy["heavy_loaded"]:
+        print(f"❌ Heavy modules imported at load time: {', '.join(lazy['heavy_loaded'])}")
+        sys.exit(1)
+    print("✅ No heavy modules imported at load time")
+
+
+if __name__ == "__main__":
+    main()
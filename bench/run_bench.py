@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark for auto_reels_to_youtube.py.
+
+Starts the local stand-ins from fake_services.py, then runs the real script
+(main() as a subprocess, fresh working directory per case) for every
+combination of reel count and concurrency level. Throughput and per-stage
+p50/p95 come from the run report the script writes itself. Before the cases,
+a 3 MB file is uploaded in 1 MB chunks to check the resumable upload path.
+
+    python bench/run_bench.py --reels 1,4,8 --concurrency 1,2,4
+    python bench/run_bench.py --latency youtube=0.2,openai=0.8 --failure-rate telegram=0.1
+    python bench/run_bench.py --output bench.json
+    python bench/run_bench.py --baseline bench.json --tolerance 0.2   # exit 1 on regression
+    python bench/run_bench.py --env STREAM_UPLOADS=1                  # streaming vs. disk path
+
+Needs ffmpeg on PATH and Playwright's Chromium installed, like the real run.
+"""
+import argparse, json, os, subprocess, sys, tempfile, time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fake_services import FakeServices, FakeWorld, ServiceProfile
+
+SCRIPT = Path(__file__).resolve().parent.parent / "auto_reels_to_youtube.py"
+SERVICES = ("instagram", "media", "youtube", "openai", "telegram")
+PROFILE = "benchreels"
+
+
+def parse_service_values(spec, cast=float):
+    """'youtube=0.2,openai=0.5' -> {'youtube': 0.2, 'openai': 0.5}; a bare number applies to all services."""
+    values = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, sep, value = part.partition("=")
+        if not sep:
+            values.update({s: cast(name) for s in SERVICES})
+        elif name not in SERVICES:
+            raise SystemExit(f"unknown service {name!r}; expected one of {', '.join(SERVICES)}")
+        else:
+            values[name] = cast(value)
+    return values
+
+
+def seed_workdir(workdir):
+    """Credentials and a fresh trends cache, so no case talks to Google."""
+    expiry = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    (workdir / "token.json").write_text(json.dumps({
+        "token": "bench-access-token", "refresh_token": "bench-refresh-token",
+        "client_id": "bench.apps.googleusercontent.com", "client_secret": "bench-secret",
+        "token_uri": "https://oauth2.googleapis.com/token", "expiry": expiry,
+        "scopes": ["https://www.googleapis.com/auth/youtube.upload",
+                   "https://www.googleapis.com/auth/youtube.force-ssl"],
+    }), encoding="utf-8")
+    (workdir / "client_secrets.json").write_text(json.dumps({
+        "installed": {"client_id": "bench.apps.googleusercontent.com", "project_id": "bench-project",
+                      "client_secret": "bench-secret"}
+    }), encoding="utf-8")
+    (workdir / "trends_cache.json").write_text(json.dumps({
+        "fetched_at": time.time(), "items": ["AI tools", "Cybersecurity news", "Linux tips", "Tech deals"],
+    }), encoding="utf-8")
+
+
+def run_case(services, reels, concurrency, args):
+    workdir = Path(tempfile.mkdtemp(prefix=f"ig2yt-bench-{reels}x{concurrency}-"))
+    seed_workdir(workdir)
+    env = dict(os.environ)
+    env.update(services.env())
+    env.update({
+        "INSTAGRAM_PROFILE": PROFILE,
+        "INSTAGRAM_PROFILES": "",
+        "UPLOAD_LIMIT": str(reels),
+        "DOWNLOAD_CONCURRENCY": str(concurrency),
+        "METADATA_CONCURRENCY": str(concurrency),
+        "UPLOAD_CONCURRENCY": str(concurrency),
+        "COMMENT_CONCURRENCY": str(concurrency),
+        "PROBE_CONCURRENCY": str(concurrency * 2),
+        "YOUTUBE_DAILY_QUOTA": "100000000",
+        "TELEGRAM_MIN_INTERVAL": "0",
+        "PYTHONUNBUFFERED": "1",
+    })
+    env.update(args.extra_env)
+
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, str(SCRIPT)], cwd=workdir, env=env,
+        capture_output=True, text=True, timeout=args.timeout,
+    )
+    wall = time.perf_counter() - started
+    (workdir / "log.txt").write_text(proc.stdout + "\n--- stderr ---\n" + proc.stderr, encoding="utf-8")
+
+    reports = sorted((workdir / "run_reports").glob("run-*.json"))
+    report = json.loads(reports[-1].read_text(encoding="utf-8")) if reports else {"stages": {}, "results": {}}
+    uploaded = sum(r.get("uploaded", 0) for r in report.get("results", {}).values())
+    return {
+        "reels": reels,
+        "concurrency": concurrency,
+        "exit_code": proc.returncode,
+        "wall_seconds": round(wall, 3),
+        "run_seconds": report.get("run_seconds"),
+        "uploaded": uploaded,
+        "reels_per_minute": round(uploaded / wall * 60, 3) if wall else 0.0,
+        "stages": {name: {"p50": st["p50"], "p95": st["p95"], "count": st["count"], "failures": st["failures"]}
+                   for name, st in report.get("stages", {}).items()},
+        "resources": report.get("resources", {}),
+        "workdir": str(workdir),
+    }
+
+
+CHUNKED_UPLOAD_CHECK = """
+import json, os, sys
+sys.path.insert(0, os.environ["IG2YT_SCRIPT_DIR"])
+import auto_reels_to_youtube as ar
+with open("clip.mp4", "wb") as f:
+    f.write(os.urandom(3 * 1024 * 1024))
+metadata = {"title": "chunk check", "description": "", "tags": [], "category_id": "28"}
+vid = ar.upload_to_youtube("clip.mp4", metadata, shortcode="CHUNKCHECK", store=ar.open_state_store())
+ar.notifier.flush()
+print(json.dumps({"video_id": vid, "youtube": ar.service_guard("youtube").snapshot()}))
+"""
+
+
+def check_chunked_upload(services, args):
+    """
+    Upload a 3 MB file in 1 MB chunks through the real upload path. Every
+    non-final chunk is answered with a Location-less 308, which the transport
+    must not treat as a redirect.
+    """
+    workdir = Path(tempfile.mkdtemp(prefix="ig2yt-bench-chunks-"))
+    seed_workdir(workdir)
+    env = dict(os.environ)
+    env.update(services.env())
+    env.update({"UPLOAD_CHUNK_MB": "1", "TELEGRAM_MIN_INTERVAL": "0", "IG2YT_SCRIPT_DIR": str(SCRIPT.parent)})
+    env.update(args.extra_env)
+    proc = subprocess.run([sys.executable, "-c", CHUNKED_UPLOAD_CHECK], cwd=workdir, env=env,
+                          capture_output=True, text=True, timeout=args.timeout)
+    lines = proc.stdout.strip().splitlines()
+    try:
+        outcome = json.loads(lines[-1]) if lines else {}
+    except ValueError:
+        outcome = {}
+    if proc.returncode or not outcome.get("video_id") or outcome["youtube"]["state"] != "closed":
+        (workdir / "log.txt").write_text(proc.stdout + "\n--- stderr ---\n" + proc.stderr, encoding="utf-8")
+        return f"multi-chunk upload failed (exit {proc.returncode}, {outcome or 'no result'}; {workdir}/log.txt)"
+    return None
+
+
+def print_table(results):
+    print(f"\n{'reels':>5} {'conc':>4} {'uploaded':>8} {'wall s':>8} {'reels/min':>9} {'rss MB':>7} {'disk+ MB':>8}"
+          f"  slowest stages (p50/p95 s)")
+    for r in results:
+        slowest = sorted(r["stages"].items(), key=lambda kv: -kv[1]["p95"])[:3]
+        stages = ", ".join(f"{name} {st['p50']:.2f}/{st['p95']:.2f}" for name, st in slowest)
+        flag = "" if r["exit_code"] == 0 else f"  ⚠️ exit {r['exit_code']} ({r['workdir']}/log.txt)"
+        res = r.get("resources", {})
+        rss = res.get("rss_peak_bytes", 0) / 1048576
+        disk = max(0, res.get("disk_peak_bytes", 0) - res.get("disk_start_bytes", 0)) / 1048576
+        print(f"{r['reels']:>5} {r['concurrency']:>4} {r['uploaded']:>8} {r['wall_seconds']:>8.2f} "
+              f"{r['reels_per_minute']:>9.2f} {rss:>7.0f} {disk:>8.1f}  {stages}{flag}")
+
+
+def compare_to_baseline(results, baseline_path, tolerance):
+    """Regressions: throughput below (1 - tolerance) of the baseline for the same case."""
+    baseline = {(b["reels"], b["concurrency"]): b
+                for b in json.loads(Path(baseline_path).read_text(encoding="utf-8"))["results"]}
+    regressions = []
+    for r in results:
+        b = baseline.get((r["reels"], r["concurrency"]))
+        if b and b["reels_per_minute"] and r["reels_per_minute"] < b["reels_per_minute"] * (1 - tolerance):
+            regressions.append(
+                f"{r['reels']} reels @ concurrency {r['concurrency']}: "
+                f"{r['reels_per_minute']:.2f} reels/min vs baseline {b['reels_per_minute']:.2f}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reels", default="1,4", help="comma-separated reel counts (UPLOAD_LIMIT per case)")
+    parser.add_argument("--concurrency", default="1,2", help="comma-separated per-stage concurrency levels")
+    parser.add_argument("--latency", default="", help="seconds per request, e.g. youtube=0.2,openai=0.5")
+    parser.add_argument("--failure-rate", default="", help="share of requests failed with 503, e.g. telegram=0.1")
+    parser.add_argument("--bandwidth", default="", help="Mbit/s for media and uploads, e.g. media=50,youtube=20")
+    parser.add_argument("--clip-seconds", type=float, default=8.0)
+    parser.add_argument("--clip-size", default="1080x1920")
+    parser.add_argument("--seed", type=int, default=1234, help="seed for failure injection")
+    parser.add_argument("--timeout", type=float, default=900, help="seconds per case")
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the script (repeatable)")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop vs baseline")
+    args = parser.parse_args()
+    args.extra_env = dict(e.split("=", 1) for e in args.env)
+
+    reel_counts = [int(x) for x in args.reels.split(",") if x.strip()]
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    latency = parse_service_values(args.latency)
+    failures = parse_service_values(args.failure_rate)
+    bandwidth = parse_service_values(args.bandwidth)
+    services = {
+        name: ServiceProfile(latency.get(name, 0.0), failures.get(name, 0.0), bandwidth.get(name, 0.0))
+        for name in SERVICES
+    }
+    # Enough reels for the largest case plus the spare candidates the script probes
+    world = FakeWorld(profiles={PROFILE: max(reel_counts) * 4 + 12}, clip_seconds=args.clip_seconds,
+                      clip_size=args.clip_size, services=services, seed=args.seed)
+
+    results = []
+    with FakeServices(world, Path(tempfile.gettempdir()) / "ig2yt-bench-media") as fake:
+        print(f"🧪 Fake services on {fake.base_url}")
+        failure = check_chunked_upload(fake, args)
+        if failure:
+            print(f"❌ {failure}")
+            sys.exit(1)
+        print("✅ Multi-chunk resumable upload OK")
+        for reels in reel_counts:
+            for level in levels:
+                print(f"▶️ {reels} reel(s) @ concurrency {level} …", flush=True)
+                results.append(run_case(fake, reels, level, args))
+    print_table(results)
+    print(f"\n📡 Requests per service: {json.dumps(world.stats)}")
+
+    if args.output:
+        payload = {"created_at": time.time(), "config": {k: v for k, v in vars(args).items() if k != "extra_env"},
+                   "results": results, "service_stats": world.stats}
+        Path(args.output).write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"💾 Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"❌ Regression: {line}")
+        if regressions:
+            sys.exit(1)
+        print("✅ No throughput regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 import asyncio
+import os
 from playwright.async_api import async_playwright
 
 async def main():
     async with async_playwright() as p:
         browser = await p.chromium.launch_persistent_context(
-            user_data_dir="ig_user_data",
+            user_data_dir=os.getenv("IG_USER_DATA_DIR", "ig_user_data"),
             headless=False,
             args=["--window-position=100,100", "--window-size=1280,720"]
         )